@@ -0,0 +1,79 @@
+#%%
+# zoom-level clustering for the grantee markers
+#
+# at each level the points are snapped to a lat/lon grid and every cell (per cohort, so the
+# marker colours still mean something) becomes one marker at the cell members' mean position,
+# sized by how many grantees it holds. cells halve at each level, and the last level (cell size
+# 0) is the individual grantees. each level is its own scattergeo trace; a small script swaps
+# the visible one as the map is zoomed, so the browser only draws one bounded set of markers.
+import json
+
+import numpy as np
+import pandas as pd
+
+# grid cell sizes in degrees, from the zoomed-out map (projection scale 1) inwards
+CELL_SIZES = (2.0, 1.0, 0.5, 0.25, 0)
+
+# names listed in a cluster's hover text before "and n more"
+MAX_NAMES = 5
+
+
+def _label(names):
+    names = list(dict.fromkeys(names))
+    if len(names) == 1:
+        return names[0]
+    label = '<br>'.join(names[:MAX_NAMES])
+    if len(names) > MAX_NAMES:
+        label += f'<br>and {len(names) - MAX_NAMES} more'
+    return label
+
+
+def cluster_points(df, cell_size, by='cohort', name='grantee', lat='lat', lon='lon'):
+    # one row per cluster: lat, lon, count, label and the `by` column
+    df = df.dropna(subset=[lat, lon])
+    if not cell_size:
+        return pd.DataFrame({
+            lat: df[lat], lon: df[lon], 'count': 1, 'label': df[name], by: df[by],
+        }).reset_index(drop=True)
+
+    cells = [
+        np.floor(df[lat].to_numpy() / cell_size).astype(int),
+        np.floor(df[lon].to_numpy() / cell_size).astype(int),
+        df[by].to_numpy(),
+    ]
+    # dropna=False: a grantee without a cohort still gets a marker at every level
+    clusters = df.groupby(cells, sort=False, dropna=False).agg(
+        lat=(lat, 'mean'), lon=(lon, 'mean'), count=(name, 'size'), label=(name, _label), **{by: (by, 'first')}
+    ).reset_index(drop=True)
+    many = clusters['count'] > 1
+    clusters.loc[many, 'label'] = clusters['count'][many].astype(str) + ' grantees<br>' + clusters['label'][many]
+    return clusters
+
+
+def cluster_levels(df, cell_sizes=CELL_SIZES, **kwargs):
+    return {cell_size: cluster_points(df, cell_size, **kwargs) for cell_size in cell_sizes}
+
+
+def marker_size(count, base=12):
+    return base + 4 * np.log2(count)
+
+
+# shows level floor(log2(scale)) of the cluster traces as the geo projection is zoomed
+ZOOM_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+var levels = %s;
+var current = 0;
+gd.on('plotly_relayout', function (event) {
+    var scale = event['geo.projection.scale'];
+    if (scale === undefined) return;
+    var level = Math.min(levels.length - 1, Math.max(0, Math.floor(Math.log2(scale))));
+    if (level === current) return;
+    current = level;
+    Plotly.restyle(gd, {visible: levels.map(function (_, i) { return i === level; })}, levels);
+});
+"""
+
+
+def zoom_script(trace_indices):
+    # post_script for fig.write_html; trace_indices are the level traces, coarsest first
+    return ZOOM_SCRIPT % json.dumps(list(trace_indices))
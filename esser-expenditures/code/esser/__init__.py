@@ -0,0 +1,17 @@
+# ESSER expenditures: ingest, metrics and figures as a library
+#
+#   from esser import compute_state_metrics, make_figure, read_state_inputs
+#
+#   df_esser, df_enrollment = read_state_inputs()
+#   df = compute_state_metrics(df_esser, df_enrollment)    # pure: no file I/O
+#   fig = make_figure('state_data_used', df)               # in memory, nothing written
+#
+# importing the package only registers the figure builders; nothing is read, written or
+# reconfigured until a function is called. paths default to ./../data and ./../figures,
+# i.e. relative to esser-expenditures/code.
+from . import figures  # noqa: F401  registers the figure builders
+from .build import FIGURES, build_figures, make_figure
+from .core import compute_state_metrics
+from .ingest import load_state_data, merge_state_data, read_state_inputs
+from .metrics import METRICS, DerivedMetrics, add_esser_metrics, add_figure_columns, metric
+from .stats import STAT_COLUMNS, describe
@@ -0,0 +1,6 @@
+# python -m esser: regenerate the state-level figures (see pipeline.py)
+import sys
+
+from .pipeline import main
+
+sys.exit(main())
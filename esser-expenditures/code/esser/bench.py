@@ -0,0 +1,250 @@
+#%%
+# benchmarks for the ESSER pipeline and the grantee map build
+#
+#   cd esser-expenditures/code
+#   python -m esser.bench                                 # 51 / 13k / 100k synthetic rows (+ the real inputs)
+#   python -m esser.bench --rows 51 13000 --save-baseline bench-baseline.json
+#   python -m esser.bench --baseline bench-baseline.json  # exits 1 if a stage regressed
+#
+# every stage (load, metrics, each figure's build, serialization and page write, geocoding and
+# clustering the grantees, building and serializing the grantee map) records wall time, how far
+# it pushed the process's peak RSS, the peak of traced Python/numpy allocations in the stage (--memory; tracemalloc slows everything down, so it's off by
+# default) and the bytes it wrote. synthetic rows repeat the 51 states, so the sizes
+# stand in for district- and school-level inputs without needing them on disk.
+import argparse
+import contextlib
+import json
+import os
+import runpy
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from .instrument import peak_rss_mb
+
+DEFAULT_ROWS = (51, 13_000, 100_000)
+
+# a stage regresses when it's this much slower / bigger than the baseline
+TIME_TOLERANCE = 1.5
+BYTES_TOLERANCE = 1.05
+# stages faster than this are too noisy to compare on time
+MIN_SECONDS = 0.25
+
+
+@contextlib.contextmanager
+def measure(results, key, memory=False):
+    # yields a dict the stage can put 'bytes' into
+    record = {}
+    if memory:
+        tracemalloc.start()
+    # ru_maxrss only ever grows, so the stage's share is what it adds to the peak so far
+    # (0 for a stage that stays under an earlier one's)
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        if memory:
+            record['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+            tracemalloc.stop()
+        if rss_before is not None:
+            record['rss_growth_mb'] = peak_rss_mb() - rss_before
+        results[key] = record
+
+
+def synthetic_state_data(rows, seed=0):
+    # a frame shaped like load_state_data()'s: the schema columns at their compact dtypes
+    from .geometry import STATES
+    from .ingest import apply_schema, enrollment_schema, esser_schema
+
+    rng = np.random.default_rng(seed)
+    states = STATES[STATES['abbreviation'] != 'PR']
+    pick = np.arange(rows) % len(states)
+    df = pd.DataFrame({'stateCode': states['abbreviation'].to_numpy()[pick]})
+    for column, kind in esser_schema.items():
+        if kind == 'amount' and 'Allocated' in column:
+            df[column] = rng.integers(10_000, 5_000_000_000, rows).astype(float)
+        elif kind == 'boolean':
+            df[column] = rng.random(rows) > 0.5
+    for column in [column for column, kind in esser_schema.items() if kind == 'amount' and 'Remaining' in column]:
+        df[column] = df[column.replace('Remaining', 'Allocated')] * rng.random(rows)
+    df = apply_schema(df, esser_schema)
+    df['state'] = states['name'].to_numpy()[pick]
+    df['Fall 2019'] = rng.integers(1_000, 6_000_000, rows)
+    df = df.astype({'state': enrollment_schema['state']})
+    return df
+
+
+def synthetic_grantees(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = pd.DataFrame({
+        'lat': rng.uniform(25, 49, 33_000),
+        'lon': rng.uniform(-124, -67, 33_000),
+    }, index=pd.Index([f'{zipcode:05d}' for zipcode in range(1_000, 100_000, 3)][:33_000], name='zipcode'))
+    grantees = pd.DataFrame({
+        'grantee': [f'Grantee {i % (rows // 3 + 1)}' for i in range(rows)],
+        'zipcode': rng.choice(centroids.index.to_numpy(), rows),
+        'state': rng.choice(['CA', 'TX', 'NY', 'RI', 'GA'], rows),
+        'category': rng.choice(['CEA State', 'State Leading Recovery'], rows),
+        'cohort': rng.choice(['CEA 2022', 'CEA 2023'], rows),
+    })
+    return grantees, centroids
+
+
+def grantee_map_inputs(site, grantees, centroids):
+    # what grantee-map.py reads, relative to the directory it runs in
+    from PIL import Image
+
+    from geocode import GAZETTEER_PATH, load_centroids
+
+    os.makedirs(os.path.join(site, 'data', 'raw'), exist_ok=True)
+    os.makedirs(os.path.join(site, 'img'), exist_ok=True)
+    grantees[['grantee', 'zipcode', 'state', 'category', 'cohort']].to_csv(
+        os.path.join(site, 'data', 'grantees.csv'), index=False)
+    gazetteer = centroids.reset_index().rename(columns={'zipcode': 'GEOID', 'lat': 'INTPTLAT', 'lon': 'INTPTLONG'})
+    gazetteer.to_csv(os.path.join(site, GAZETTEER_PATH), sep='\t', index=False)
+    Image.new('RGBA', (400, 120)).save(os.path.join(site, 'img', 'accelerate-logo.png'))
+
+
+def bench_figures(results, prefix, df, out_dir, memory=False):
+    from . import output
+    from .build import FIGURES, make_figure
+
+    for name in FIGURES:
+        with measure(results, f'{prefix}/build/{name}', memory):
+            fig = make_figure(name, df)
+        with measure(results, f'{prefix}/serialize/{name}', memory) as record:
+            record['bytes'] = len(output.figure_json(fig).encode('utf-8'))
+        with measure(results, f'{prefix}/write/{name}', memory) as record:
+            page = output.write_figure(fig, os.path.join(out_dir, f'{name}.html'))
+            record['bytes'] = os.path.getsize(page)
+
+
+def bench_state_pipeline(results, prefix, load, out_dir, memory=False):
+    from .metrics import add_esser_metrics, add_figure_columns
+    from .stats import BOOTSTRAP_SAMPLES, describe
+
+    with measure(results, f'{prefix}/load', memory):
+        df = load()
+    with measure(results, f'{prefix}/metrics', memory):
+        df = add_esser_metrics(df)
+    with measure(results, f'{prefix}/figure_columns', memory):
+        df = add_figure_columns(df)
+    with measure(results, f'{prefix}/stats', memory):
+        describe(df)
+    with measure(results, f'{prefix}/stats/bootstrap', memory):
+        describe(df, samples=BOOTSTRAP_SAMPLES)
+    bench_figures(results, prefix, df, out_dir, memory)
+
+
+def bench_grantees(results, prefix, rows, memory=False):
+    # geocode.py and cluster.py live at the repo root, three levels above this package
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import plotly.io as pio
+
+    from cluster import cluster_levels
+    from geocode import geocode, load_centroids
+
+    from . import output
+
+    grantees, centroids = synthetic_grantees(rows)
+    with measure(results, f'{prefix}/geocode', memory):
+        grantees[['lat', 'lon']] = geocode(grantees['zipcode'], centroids).to_numpy()
+    with measure(results, f'{prefix}/cluster', memory) as record:
+        levels = cluster_levels(grantees)
+        record['markers'] = {str(cell_size): len(clusters) for cell_size, clusters in levels.items()}
+
+    # grantee-map.py itself, run against the synthetic grantees in a scratch directory. the
+    # gazetteer cache and plotly.js are written beforehand, as they are on a rebuild, so the
+    # stage is the page build: geocoding, clustering, the figure and index.html
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as site:
+        grantee_map_inputs(site, grantees, centroids)
+        os.chdir(site)
+        try:
+            load_centroids()
+            output.plotlyjs_bundle('.')
+            with measure(results, f'{prefix}/map', memory) as record:
+                page = runpy.run_path(os.path.join(root, 'grantee-map.py'))
+                record['bytes'] = os.path.getsize('index.html')
+        finally:
+            os.chdir(cwd)
+    with measure(results, f'{prefix}/map/serialize', memory) as record:
+        record['bytes'] = len(pio.to_json(page['fig'], validate=False).encode('utf-8'))
+
+
+def compare(results, baseline):
+    # [(key, field, baseline value, new value)] for every stage that got slower or bigger
+    regressions = []
+    for key, record in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        if record['seconds'] >= MIN_SECONDS and record['seconds'] > before['seconds'] * TIME_TOLERANCE:
+            regressions.append((key, 'seconds', before['seconds'], record['seconds']))
+        if 'bytes' in record and 'bytes' in before and record['bytes'] > before['bytes'] * BYTES_TOLERANCE:
+            regressions.append((key, 'bytes', before['bytes'], record['bytes']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m esser.bench', description='Benchmark the ESSER pipeline.')
+    parser.add_argument('--rows', nargs='+', type=int, default=list(DEFAULT_ROWS), help='synthetic row counts')
+    parser.add_argument('--no-real', action='store_true', help="skip the real inputs even if they're there")
+    parser.add_argument('--memory', action='store_true', help='trace allocations per stage (slow)')
+    parser.add_argument('--output', default='bench-results.json', help='where to write the results')
+    parser.add_argument('--baseline', help='compare against this results file')
+    parser.add_argument('--save-baseline', metavar='PATH', help='also write the results here as the new baseline')
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.filterwarnings("ignore", category=FutureWarning)
+
+    from . import figures  # noqa: F401  registers the figure builders
+    from . import output
+    from .ingest import RAW_DIR, load_state_data
+
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        # the shared plotly.js is written once, and the lazily imported plotting modules loaded,
+        # rather than timed as part of whichever figure comes first
+        output.plotlyjs_bundle(out_dir)
+        import plotly.express  # noqa: F401
+        import scipy.stats  # noqa: F401
+        if not args.no_real and os.path.exists(f'{RAW_DIR}/esser-federal-data.xlsx'):
+            bench_state_pipeline(results, 'real', load_state_data, out_dir, args.memory)
+        for rows in args.rows:
+            bench_state_pipeline(results, f'{rows}', lambda: synthetic_state_data(rows), out_dir, args.memory)
+            bench_grantees(results, f'{rows}/grantees', rows, args.memory)
+
+    width = max(len(key) for key in results)
+    for key, record in results.items():
+        size = f"{record['bytes'] / 1e3:10.1f} KB" if 'bytes' in record else ' ' * 13
+        rss = f"{record['rss_growth_mb']:8.1f} MB rss+" if 'rss_growth_mb' in record else ' ' * 16
+        traced = f"{record['traced_peak_mb']:8.1f} MB traced" if 'traced_peak_mb' in record else ''
+        print(f"{key:<{width}} {record['seconds'] * 1e3:10.1f} ms {size} {rss} {traced}")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file))
+        for key, field, before, after in regressions:
+            print(f'REGRESSION {key} {field}: {before:,.3f} -> {after:,.3f}')
+        if regressions:
+            return 1
+        print(f'No regressions against {args.baseline}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
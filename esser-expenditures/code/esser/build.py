@@ -0,0 +1,224 @@
+#%%
+# incremental figure builds
+#
+# each figure is registered with the DataFrame columns and config it depends on. a
+# fingerprint of those inputs (plus the builder's source) is kept next to the output,
+# and a figure is only rebuilt and rewritten when its fingerprint changes.
+import functools
+import hashlib
+import importlib
+import inspect
+import json
+import os
+from collections import namedtuple
+
+import pandas as pd
+
+from . import output
+from .instrument import stage
+
+FigureSpec = namedtuple('FigureSpec', ['name', 'build', 'columns', 'config'])
+
+FIGURES = {}
+
+MANIFEST = '.fingerprints.json'
+
+# the template every figure is drawn with. make_figure sets it on each figure, so plotly's
+# global default is never touched: importing the package or building on several threads
+# leaves it alone
+TEMPLATE = 'plotly_white'
+
+# modules whose helpers and constants the builders read (column names, colour scales, the
+# data source lists and get_data_sources_used, the stats engine, the page template and json
+# encoding). their source and plain-data constants go into every fingerprint along with the
+# builder's own module, so editing one of them marks the figures stale
+SHARED_MODULES = ('figures', 'metrics', 'stats', 'output')
+
+
+def figure(name, columns, **config):
+    # register build(df, **config) -> fig; df only carries the declared columns
+    def register(build):
+        FIGURES[name] = FigureSpec(name, build, tuple(columns), config)
+        return build
+    return register
+
+
+@functools.lru_cache(maxsize=None)
+def _module_source(name):
+    return inspect.getsource(importlib.import_module(name))
+
+
+def _module_constants(name):
+    # read on every call rather than cached, so a constant changed at runtime counts too
+    module = importlib.import_module(name)
+    constants = {
+        key: value for key, value in vars(module).items()
+        if not key.startswith('_') and isinstance(value, (str, int, float, bool, list, tuple, dict))
+    }
+    return json.dumps(constants, sort_keys=True, default=str)
+
+
+def fingerprint(spec, df, page_config=None, bundle_dir='.'):
+    # bundle_dir: where the pages load plotly.js from, relative to them
+    import plotly
+
+    digest = hashlib.sha256()
+    digest.update(inspect.getsource(spec.build).encode('utf-8'))
+    modules = sorted({spec.build.__module__, *(f'{__package__}.{name}' for name in SHARED_MODULES)})
+    for name in modules:
+        digest.update(_module_source(name).encode('utf-8'))
+        digest.update(_module_constants(name).encode('utf-8'))
+    digest.update(json.dumps(spec.config, sort_keys=True, default=str).encode('utf-8'))
+    digest.update(f'{plotly.__version__}:{output.PLOTLYJS_MODE}:{bundle_dir}:{TEMPLATE}'.encode('utf-8'))
+    digest.update(json.dumps(page_config or {}, sort_keys=True).encode('utf-8'))
+    inputs = df[list(spec.columns)]
+    digest.update(json.dumps([[name, str(dtype)] for name, dtype in inputs.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(inputs, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+
+def make_figure(name, df):
+    # build one registered figure from the metrics frame, in memory; nothing is written. the
+    # template is set on the figure rather than as plotly's default, which is global state
+    # that concurrent builds (the server's threads) would race on
+    spec = FIGURES[name]
+    fig = spec.build(df[list(spec.columns)], **spec.config)
+    return fig.update_layout(template=TEMPLATE)
+
+
+def render_figure(spec, df, out_dir, page_config=None, bundle_dir=None):
+    # build one figure and write its page and dashboard spec
+    with stage(f'build:{spec.name}'):
+        fig = make_figure(spec.name, df)
+    with stage(f'write:{spec.name}') as event:
+        page = output.write_figure(fig, os.path.join(out_dir, f'{spec.name}.html'), config=page_config,
+                                   bundle_dir=bundle_dir)
+        spec_file = output.write_spec(fig, spec_path(out_dir, spec.name))
+        event['bytes'] = os.path.getsize(page)
+        event['spec_bytes'] = os.path.getsize(spec_file)
+    print(f"Saved: {page}")
+    return fig, output.dashboard_entry(fig, spec.name)
+
+
+def spec_path(out_dir, name):
+    return os.path.join(out_dir, 'specs', f'{name}.json')
+
+
+# process pool rendering: the frame is written once as an uncompressed Arrow IPC file and
+# every worker memory-maps it, so the data isn't pickled and copied into each task
+_worker_frame = None
+
+
+def _init_worker(frame_path, modules):
+    global _worker_frame
+    import importlib
+    import warnings
+
+    import pyarrow as pa
+
+    warnings.filterwarnings("ignore", category=FutureWarning)
+    for module in modules:
+        importlib.import_module(module)  # registers the figure builders
+    # the map stays open for the worker's lifetime since the frame's columns point into it
+    _worker_frame = pa.ipc.open_file(pa.memory_map(frame_path)).read_all().to_pandas(split_blocks=True)
+
+
+def _render_in_worker(name, out_dir, page_config, bundle_dir):
+    _, entry = render_figure(FIGURES[name], _worker_frame, out_dir, page_config, bundle_dir)
+    return name, entry
+
+
+def render_parallel(specs, df, out_dir, workers, page_config=None, bundle_dir=None):
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    import pyarrow as pa
+
+    columns = list(dict.fromkeys(column for spec in specs for column in spec.columns))
+    modules = sorted({spec.build.__module__ for spec in specs})
+    # the shared plotly.js is written once up front rather than raced for by the workers
+    if output.PLOTLYJS_MODE == 'shared':
+        output.plotlyjs_bundle(bundle_dir or out_dir)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        frame_path = os.path.join(tmp_dir, 'frame.arrow')
+        table = pa.Table.from_pandas(df[columns], preserve_index=True)
+        with pa.OSFile(frame_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(frame_path, modules)) as pool:
+            futures = [pool.submit(_render_in_worker, spec.name, out_dir, page_config, bundle_dir) for spec in specs]
+            return dict(future.result() for future in futures)
+
+
+def build_figures(df, out_dir, names=None, force=False, show=False, workers=1, thumbnail_sizes=None,
+                  bundle_dir=None):
+    # rebuild the selected figures (all by default) whose inputs changed; returns their names.
+    # workers > 1 renders them across a process pool (0 means one per CPU). thumbnail_sizes
+    # overrides output.THUMBNAIL_SIZES for the images written next to them ([] for none).
+    # bundle_dir is where the shared plotly.js goes (out_dir by default); a build into a
+    # subdirectory of the figures passes the figures directory so both load the same file
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    # read once here and handed to the workers, so every page is written with the config
+    # that's in its fingerprint
+    page_config = output.figure_config(out_dir)
+    stale = {}
+    for name in names or FIGURES:
+        spec = FIGURES[name]
+        digest = fingerprint(spec, df, page_config, os.path.relpath(bundle_dir or out_dir, out_dir))
+        page = os.path.join(out_dir, f'{name}.html')
+        if force or manifest.get(name, {}).get('fingerprint') != digest or not os.path.exists(page):
+            stale[name] = digest
+
+    specs = [FIGURES[name] for name in stale]
+    workers = workers or os.cpu_count()
+    if workers > 1 and len(specs) > 1:
+        entries = render_parallel(specs, df, out_dir, min(workers, len(specs)), page_config, bundle_dir)
+        figs = {}
+    else:
+        figs, entries = {}, {}
+        for spec in specs:
+            figs[spec.name], entries[spec.name] = render_figure(spec, df, out_dir, page_config, bundle_dir)
+
+    def loaded(name):
+        # rendered here, or read back from the spec a worker (or an earlier build) wrote
+        return figs[name] if name in figs else output.read_spec(spec_path(out_dir, name))
+
+    # thumbnails for the rebuilt figures, and for any figure missing one of the requested
+    # sizes (a new --thumbnail-sizes, or a deleted image) even if its page is up to date
+    sizes = output.THUMBNAIL_SIZES if thumbnail_sizes is None else thumbnail_sizes
+    if sizes and not output.thumbnails_available():
+        print('kaleido is not installed; not writing thumbnails')
+    elif sizes:
+        thumbnailed = [name for name in names or FIGURES if name in stale or output.missing_thumbnails(out_dir, name, sizes)]
+        if thumbnailed:
+            # in this process rather than the workers, so one kaleido process renders the whole batch
+            with stage('thumbnails', figures=len(thumbnailed)) as event:
+                images = output.write_thumbnails({name: loaded(name) for name in thumbnailed}, out_dir, sizes)
+                event['images'] = len(images)
+
+    for name, digest in stale.items():
+        manifest[name] = {'fingerprint': digest, **entries[name]}
+        if show:
+            loaded(name).show()
+
+    save_manifest(out_dir, manifest)
+    dashboard = {name: manifest[name] for name in FIGURES if name in manifest}
+    output.write_dashboard(dashboard, os.path.join(out_dir, 'dashboard.html'), bundle_dir=bundle_dir)
+    return list(stale)
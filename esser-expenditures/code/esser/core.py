@@ -0,0 +1,21 @@
+#%%
+# the pure compute core: input frames in, metrics frame out
+#
+# no file I/O, no plotting, and the frames passed in are never modified, so other code can
+# call it in a loop (e.g. over edited or simulated inputs) without touching the disk.
+from .ingest import merge_state_data
+from .instrument import stage
+from .metrics import ESSER_METRICS, FIGURE_METRICS, DerivedMetrics
+
+
+def compute_state_metrics(df_esser, df_enrollment):
+    # df_esser: the ESSER prime sheet (at least the ingest.esser_schema columns)
+    # df_enrollment: the enrollment sheet ('state', 'Fall 2019')
+    # returns one row per state with esserAllocated, totalesserspent, expenditure_per_student,
+    # rank, data_source_score and the rest of the columns the figures read
+    # the merge and the derived (imputed) metrics are their own stages in the stage log
+    with stage('merge') as event:
+        df = merge_state_data(df_esser, df_enrollment)
+        event['rows'] = len(df)
+    with stage('impute'):
+        return DerivedMetrics(df, enrollment_column='Fall 2019').add_columns(ESSER_METRICS + FIGURE_METRICS)
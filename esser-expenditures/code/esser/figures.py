@@ -0,0 +1,603 @@
+#%%
+# state-level ESSER figures
+#
+# each builder takes the metrics frame (projected to the columns it declares) and returns
+# the figure; build.build_figures decides which ones need rebuilding and writes them, and
+# build.make_figure builds one in memory. they're drawn with build.TEMPLATE.
+#
+# plotly.express and scipy.stats are slow to import, so builders import them when they
+# run; registering the figures (and skipping unchanged ones) doesn't pay for them.
+import plotly.graph_objects as go
+
+from .build import figure
+from .metrics import data_source_columns, get_data_sources_used
+from .stats import NBINS, describe
+
+
+# Function to add "icon.png" to the bottom left-hand side of the figure
+def add_icon(fig):
+    from PIL import Image
+
+    fig.add_layout_image(
+        dict(
+            source=Image.open('icon.png'),
+            xref="paper", yref="paper",
+            x=0, y=0,
+            sizex=0.15, sizey=0.15,
+            xanchor="left", yanchor="bottom",
+            opacity=1,
+            layer="above"
+        )
+    )
+    return fig
+
+
+# Dictionary mapping columns to natural language names
+columns_with_names = {
+    'anyEsserASeaDirectActivitiesLearningLoss': 'Did the state directly administer activities to address the learning loss of students disproportionately impacted by COVID-19?',
+    'areEsser1SeaFundsAwarded': 'Did the state award ESSER I SEA Reserve Funds to local educational agencies (LEAs) during the reporting period?',
+    'areEsser2SeaFundsAwarded': 'Did the state award ESSER II SEA Reserve Funds to LEAs during the reporting period?',
+    'areEsser3LearningLossFundsAwarded': 'Did the state award ARP ESSER III Learning Loss Funds to LEAs during the reporting period?',
+    'areEsser3SummerEnrichmentAwarded': 'Did the state award ARP ESSER III Summer Enrichment Funds to LEAs during the reporting period?',
+    'areEsser3AfterschoolProgramsAwarded': 'Did the state award ARP ESSER III Afterschool Program Funds to LEAs during the reporting period?',
+    'areEsser3OtherAwarded': 'Did the state award ARP ESSER III Other Reserve Funds to LEAs during the reporting period?',
+    'areEsser1SeaNonLeaFundsAwarded': 'Did the state award ESSER I SEA Reserve Funds to non-LEA entities during the reporting period?',
+    'areEsser2SeaNonLeaFundsAwarded': 'Did the state award ESSER II SEA Reserve Funds to non-LEA entities during the reporting period?',
+    'areEsser3NonLeaLearningLossFundsAwarded': 'Did the state award ARP ESSER III Learning Loss Funds to non-LEA entities during the reporting period?',
+    'areEsser3NonLeaSummerEnrichmentAwarded': 'Did the state award ARP ESSER III Summer Enrichment Funds to non-LEA entities during the reporting period?',
+    'areEsser3NonLeaAfterschoolProgramsAwarded': 'Did the state award ARP ESSER III Afterschool Program Funds to non-LEA entities during the reporting period?',
+    'areEsser3NonLeaOtherAwarded': 'Did the state award ARP ESSER III Other Reserve Funds to non-LEA entities during the reporting period?',
+}
+
+abbreviation_map = {
+    'anyEsserASeaDirectActivitiesLearningLoss': 'Direct activities for learning loss',
+    'areEsser1SeaFundsAwarded': 'ESSER I funds to LEAs',
+    'areEsser2SeaFundsAwarded': 'ESSER II funds to LEAs',
+    'areEsser3LearningLossFundsAwarded': 'ESSER III learning loss funds to LEAs',
+    'areEsser3SummerEnrichmentAwarded': 'ESSER III summer enrichment to LEAs',
+    'areEsser3AfterschoolProgramsAwarded': 'ESSER III afterschool programs to LEAs',
+    'areEsser3OtherAwarded': 'ESSER III other funds to LEAs',
+    'areEsser1SeaNonLeaFundsAwarded': 'ESSER I funds to non-LEAs',
+    'areEsser2SeaNonLeaFundsAwarded': 'ESSER II funds to non-LEAs',
+    'areEsser3NonLeaLearningLossFundsAwarded': 'ESSER III learning loss funds to non-LEAs',
+    'areEsser3NonLeaSummerEnrichmentAwarded': 'ESSER III summer enrichment to non-LEAs',
+    'areEsser3NonLeaAfterschoolProgramsAwarded': 'ESSER III afterschool programs to non-LEAs',
+    'areEsser3NonLeaOtherAwarded': 'ESSER III other funds to non-LEAs',
+    'anyEsserAStrategiesIdentifyStudents': 'Strategies to identify impacted students',
+    'isEsserAIdentifiedByStudentDemographic': 'Demographic data',
+    'isEsserAIdentifiedByStudentOutcome': 'Academic outcome data',
+    'isEsserAIdentifiedByOtherStudentOutcome': 'Other student outcome data',
+    'isEsserAIdentifiedByMissedDays': 'Missed days data',
+    'isEsserAIdentifiedByOpportunityToLearn': 'Opportunity to learn data',
+    'isEsserAIdentifiedByStateAdministrativeData': 'State administrative data',
+    'isEsserAIdentifiedByHealthData': 'Health data',
+    'isEsserAIdentifiedByStakeholderInput': 'Stakeholder input',
+    'isEsserAIdentifiedByOtherData': 'Other data'
+}
+
+# Dictionary mapping combined columns to natural language names
+combined_columns_with_names = {
+    'anyEsserASeaDirectActivitiesLearningLoss': 'Did the state directly administer activities to address the learning loss of students disproportionately impacted by COVID-19?',
+    'seaFundsAwarded': 'Did the state award ESSER SEA Reserve Funds to local educational agencies (LEAs) during the reporting period?',
+    'seaNonLeaFundsAwarded': 'Did the state award ESSER SEA Reserve Funds to non-LEA entities during the reporting period?',
+    'learningLossFundsAwarded': 'Did the state award ARP ESSER Learning Loss Funds to LEAs during the reporting period?',
+    'summerEnrichmentAwarded': 'Did the state award ARP ESSER Summer Enrichment Funds to LEAs during the reporting period?',
+    'afterschoolProgramsAwarded': 'Did the state award ARP ESSER Afterschool Program Funds to LEAs during the reporting period?',
+    'otherAwarded': 'Did the state award ARP ESSER Other Reserve Funds to LEAs during the reporting period?',
+}
+
+# Combined columns are 'Yes' (True) if any ESSER # has a 'Yes' for the category
+combined_column_sources = {
+    'anyEsserASeaDirectActivitiesLearningLoss': ['anyEsserASeaDirectActivitiesLearningLoss'],
+    'seaFundsAwarded': ['areEsser1SeaFundsAwarded', 'areEsser2SeaFundsAwarded'],
+    'seaNonLeaFundsAwarded': ['areEsser1SeaNonLeaFundsAwarded', 'areEsser2SeaNonLeaFundsAwarded'],
+    'learningLossFundsAwarded': ['areEsser3LearningLossFundsAwarded', 'areEsser3NonLeaLearningLossFundsAwarded'],
+    'summerEnrichmentAwarded': ['areEsser3SummerEnrichmentAwarded', 'areEsser3NonLeaSummerEnrichmentAwarded'],
+    'afterschoolProgramsAwarded': ['areEsser3AfterschoolProgramsAwarded', 'areEsser3NonLeaAfterschoolProgramsAwarded'],
+    'otherAwarded': ['areEsser3OtherAwarded', 'areEsser3NonLeaOtherAwarded'],
+}
+
+# Define the colorscale mapping 0 to 'coral' and 1 to 'teal'
+yes_no_colorscale = [
+    [0.0, '#304A6F'],
+    [0.4999, '#304A6F'],
+    [0.5, '#10A59C'],
+    [1.0, '#10A59C']
+]
+
+percent_spent_columns = [
+    ('totalesserspent', 'What Percent of ESSER Funds are Spent?    '),
+    ('esser1expendpercent', 'What Percent of ESSER I is Spent?    '),
+    ('esser2expendpercent', 'What Percent of ESSER II is Spent?    '),
+    ('esser3expendpercent', 'What Percent of ESSER III is Spent?    '),
+]
+
+
+# dropdown maps are one choropleth whose data arrays the dropdown swaps with restyle, so the
+# locations and trace settings are written once and each option only adds its own arrays.
+# options is [(label, {'z': values, 'text': values, ...})]; the first one is shown initially.
+# returns the figure and the dropdown buttons for its updatemenus
+def dropdown_choropleth(locations, options, **trace):
+    def arrays(data):
+        return {attribute: list(values) for attribute, values in data.items()}
+
+    fig = go.Figure(go.Choropleth(locations=list(locations), **arrays(options[0][1]), **trace))
+    buttons = [
+        dict(
+            label=label,
+            method='restyle',
+            args=[{attribute: [values] for attribute, values in arrays(data).items()}, [0]],
+        )
+        for label, data in options
+    ]
+    return fig, buttons
+
+
+# %%
+# how much spent per state
+@figure('state-esser-allocations', columns=['stateCode', 'esserAllocated'])
+def state_esser_allocations(df):
+    import plotly.express as px
+
+    df_map = df[['stateCode', 'esserAllocated']]
+
+    df_map['esserAllocated'] = df_map['esserAllocated'].astype(float)
+
+    # Create the map
+    fig = px.choropleth(
+        df_map,
+        locations='stateCode',
+        locationmode="USA-states",
+        color='esserAllocated',
+        color_continuous_scale="Viridis",
+        scope="usa",
+        labels={'esserAllocated':'ESSER I Grant Amount Allocated'},
+        title="How much ESSER funding was allocated to each state?"
+    )
+
+    fig.update_traces(
+        showscale=False  # Hide the color scale (legend)
+    )
+
+    fig.update_layout(
+        title={
+            'text':'How much ESSER funding was allocated to each state?',
+            'y': 0.95,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top',
+            'font': dict(size=40, family="Castoro", color="black")
+        },
+    )
+    return fig
+
+
+def histogram_bins(distribution, column):
+    # the stats engine's bins as plotly xbins, so the bars drawn are the counts the normal curve
+    # is scaled to (plotly would otherwise pick its own bins from nbins)
+    summary = distribution.summary.loc[column]
+    if not summary.bin_size > 0:
+        return None
+    return dict(start=distribution.edges.loc[column].iloc[0], end=summary['max'], size=summary.bin_size)
+
+
+# %%
+# histogram
+@figure('state-esser-allocations-histogram', columns=['stateCode', 'esserAllocated'])
+def state_esser_allocations_histogram(df):
+    import plotly.express as px
+
+    # bins, fitted curve and normality test from the stats engine
+    distribution = describe(df, ['esserAllocated'], samples=0)
+    stats = distribution.summary.loc['esserAllocated']
+
+    hover_data = {
+        'stateCode': True,  # Show the stateCode
+        'esserAllocated': ':.2f'  # Show the esserAllocated with 2 decimal places
+    }
+
+    # Create the Plotly histogram
+    fig = px.histogram(
+        df,
+        x='esserAllocated',
+        nbins=NBINS,
+        color='stateCode',  # Use stateCode to differentiate states in hover
+        hover_data=hover_data,
+        labels={'esserAllocated': 'ESSER Allocated'},
+        title='Histogram of ESSER Allocated',
+        color_discrete_map={state: 'rgb(0, 51, 102)' for state in df['stateCode'].unique()}
+    )
+
+    # Update layout for a modern look and remove the legend
+    fig.update_layout(
+        xaxis_title='ESSER Allocated',
+        yaxis_title='Frequency',
+        title_font=dict(size=20, family='Arial', color='darkblue'),
+        xaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGrey'),
+        yaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGrey'),
+        plot_bgcolor='whitesmoke',
+        bargap=0.1,
+        showlegend=False  # Remove the legend
+    )
+
+    # every state's trace on the same bins, from the stats engine
+    fig.update_traces(xbins=histogram_bins(distribution, 'esserAllocated'), selector=dict(type='histogram'))
+
+    # Add the normal distribution curve (scaled to the histogram) to the plot
+    fig.add_trace(go.Scatter(x=distribution.curve_x.loc['esserAllocated'], y=distribution.curve_y.loc['esserAllocated'],
+                             mode='lines', name='Normal Distribution', line=dict(color='darkblue', width=2)))
+
+    note_text = f'Shapiro-Wilk Test: Statistic={stats.shapiro_stat:.4f}, p-value={stats.shapiro_p:.4f}'
+    fig.add_annotation(
+        text=note_text,
+        xref='paper', yref='paper',
+        x=0, y=-0.15,
+        showarrow=False,
+        font=dict(size=12, color="darkblue")
+    )
+    return fig
+
+
+# %%
+# how much spent per student
+@figure('state-esser-allocations-per-student', columns=['stateCode', 'expenditure_per_student_numeric', 'rank'])
+def state_esser_allocations_per_student(df):
+    import plotly.express as px
+
+    # Create the map using Plotly
+    fig = px.choropleth(
+        df,
+        locations='stateCode',  # Use state abbreviations for locations
+        locationmode="USA-states",
+        color='expenditure_per_student_numeric',  # Color by numeric expenditure per student for continuous scale
+        color_continuous_scale="Viridis",  # Use a color scale (you can choose a different one if you prefer)
+        scope="usa",  # Focus on the USA map
+        labels={'expenditure_per_student_numeric': 'Expenditure per Student'},
+        title="Expenditure per Student by State"
+    )
+
+    # Update the hover data to show the formatted expenditure per student and the rank among
+    # the states drawn (all of them, or the server's selection)
+    fig.update_traces(hovertemplate="<b>%{location}</b><br>Expenditure per Student: %{z:$,.2f}<br>Rank: %{customdata}/" + str(len(df)),
+                      customdata=df['rank'])
+
+    fig.update_layout(
+        title={
+            'text':'How much ESSER funding was allocated per student?',
+            'y': 0.95,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top',
+            'font': dict(size=40, family="Castoro", color="black")
+        },
+    )
+    return fig
+
+
+# %%
+# histogram
+@figure('state-esser-allocations-per-student-histogram', columns=['stateCode', 'expenditure_per_student_numeric'])
+def state_esser_allocations_per_student_histogram(df):
+    import plotly.express as px
+
+    # bins, fitted curve and normality test from the stats engine
+    distribution = describe(df, ['expenditure_per_student_numeric'], samples=0)
+    stats = distribution.summary.loc['expenditure_per_student_numeric']
+
+    hover_data = {
+        'stateCode': True,  # Show the stateCode
+        'expenditure_per_student_numeric': ':.2f'  # Show the expenditure with 2 decimal places
+    }
+
+    # histogram plot
+    num_states = len(df['stateCode'].unique())
+
+    # Generate a color scale with enough shades of blue for all states
+    blues = px.colors.sample_colorscale('Blues', [0.2 + n / num_states * 0.8 for n in range(num_states)])
+
+    # Create the color_discrete_map with different shades of blue for each state
+    color_discrete_map = {state: blues[i] for i, state in enumerate(df['stateCode'].unique())}
+
+    # Create the Plotly histogram
+    fig = px.histogram(
+        df,
+        x='expenditure_per_student_numeric',
+        nbins=NBINS,
+        color='stateCode',  # Use stateCode to differentiate states in hover
+        hover_data=hover_data,
+        labels={'expenditure_per_student_numeric': 'Expenditure per Student'},
+        title='Histogram of Expenditure per Student',
+        color_discrete_map=color_discrete_map  # Apply varying blue shades
+    )
+
+    # Update layout for a modern look and remove the legend
+    fig.update_layout(
+        xaxis_title='Expenditure per Student',
+        yaxis_title='Frequency',
+        title_font=dict(size=20, family='Arial', color='darkblue'),
+        xaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGrey'),
+        yaxis=dict(showgrid=True, gridwidth=1, gridcolor='LightGrey'),
+        plot_bgcolor='whitesmoke',
+        bargap=0.1,
+        showlegend=False  # Remove the legend
+    )
+
+    # every state's trace on the same bins, from the stats engine
+    fig.update_traces(xbins=histogram_bins(distribution, 'expenditure_per_student_numeric'), selector=dict(type='histogram'))
+
+    # Add the normal distribution curve (scaled to the histogram) to the plot
+    fig.add_trace(go.Scatter(x=distribution.curve_x.loc['expenditure_per_student_numeric'],
+                             y=distribution.curve_y.loc['expenditure_per_student_numeric'],
+                             mode='lines', name='Normal Distribution', line=dict(color='darkblue', width=2)))
+
+    note_text = f'Shapiro-Wilk Test: Statistic={stats.shapiro_stat:.4f}, p-value={stats.shapiro_p:.4f}'
+    fig.add_annotation(
+        text=note_text,
+        xref='paper', yref='paper',
+        x=0, y=-0.15,
+        showarrow=False,
+        font=dict(size=12, color="darkblue")
+    )
+    return fig
+
+
+# %%
+# which reserve funds did each state award?
+@figure('state_esser_uses', columns=['stateCode', *columns_with_names])
+def state_esser_uses(df):
+    # Map boolean columns to numerical values for z, and 'Yes'/'No' for text
+    z = {column: df[column].map({True: 1, False: 0}) for column in columns_with_names}
+    text = {column: df[column].map({True: 'Yes', False: 'No'}) for column in columns_with_names}
+
+    fig, buttons = dropdown_choropleth(
+        df['stateCode'],
+        [(name, {'z': z[column], 'text': text[column]}) for column, name in columns_with_names.items()],
+        locationmode="USA-states",
+        colorscale=yes_no_colorscale,
+        zmin=0,
+        zmax=1,
+        marker_line_color='white',
+        colorbar=dict(
+            title="",
+            tickvals=[0, 1],
+            ticktext=['No', 'Yes'],
+        ),
+        hovertemplate='<b>%{location}</b><br>%{text}<extra></extra>',  # 'Yes'/'No' hover text
+        showscale=True  # Remove the legend
+    )
+
+    # Update the figure layout with dropdown menu and set the font to Poppins
+    fig.update_layout(
+        updatemenus=[dict(
+            buttons=buttons,
+            direction='down',
+            pad={'r': 10, 't': 10},
+            showactive=True,
+            x=0.5,
+            xanchor='center',
+            y=1.0,
+            yanchor='top',
+            font=dict(family='Poppins', size=16),
+        )],
+        margin=dict(l=0, r=0, t=50, b=0),
+        geo=dict(scope='usa'),
+    )
+    return fig
+
+
+# %%
+# what data is used to identify students hit hardest by COVID-19?
+@figure('state_data_used', columns=['stateCode', 'data_source_score', 'data_sources_used'])
+def state_data_used(df):
+    import plotly.express as px
+
+    # Create the choropleth map with a continuous gradient color scale
+    fig = px.choropleth(
+        df,
+        locations='stateCode',
+        locationmode="USA-states",
+        color='data_source_score',
+        color_continuous_scale='Viridis',  # Continuous gradient color scale
+        scope="usa",
+        labels={'data_source_score': 'Number of Data Sources Used'},
+        title='What data is used to identify students hit hardest by COVID-19?',
+        hover_data={
+            'stateCode': False,              # State code is not shown here; it's shown in the hovertemplate
+            'data_source_score': True,       # Number of data sources used
+            'data_sources_used': True        # List of data sources used
+        }
+    )
+
+    fig.update_layout(
+        title={
+            'text':'What data is used to identify students hit hardest by COVID-19?',
+            'y': 0.95,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top',
+            'font': dict(size=40, family="Castoro", color="black")
+        },
+    )
+
+    # Make sure to pass `customdata` to the trace to use in hovertemplate
+    fig.update_traces(
+        customdata=df[['data_sources_used']],  # Pass the custom data to the trace
+        hovertemplate="<b>%{location}</b><br>" +   # State name (uses location value)
+                      "Number of Data Sources Used: %{z}<br>" +  # Show the number of data sources
+                      "Sources: %{customdata[0]}"  # Correctly reference custom data for sources
+    )
+    return fig
+
+
+# %%
+@figure('state_data_used_bar', columns=['stateCode', *data_source_columns])
+def state_data_used_bar(df):
+    import plotly.express as px
+
+    # Sum the counts for each data source and sort them
+    data_source_counts = df[data_source_columns].sum().sort_values(ascending=True)
+
+    # Map to natural language names using the abbreviation map
+    data_source_counts.index = data_source_counts.index.map(abbreviation_map)
+
+    # States that used each data source, keyed by natural language name
+    _, states_by_data_source = get_data_sources_used(df, data_source_columns, data_source_columns)
+    data_source_states = {abbreviation_map[col]: states for col, states in states_by_data_source.items()}
+
+    # Prepare custom hover data
+    custom_hover_data = [[data_source_states[data_source]] for data_source in data_source_counts.index]
+
+    # Create the bar chart
+    fig = px.bar(
+        data_source_counts,
+        x=data_source_counts.values,
+        y=data_source_counts.index,
+        orientation='h',
+        labels={'x': 'Number of States', 'y': 'Data Source'},
+        title="Distribution of data sources used to identify students hit hardest by COVID-19"
+    )
+
+    # Update hover template to include states
+    fig.update_traces(
+        customdata=custom_hover_data,  # Attach the custom hover data
+        hovertemplate="<b>%{y}</b><br>" +  # Data source name
+                      "Number of States: %{x}<br>" +  # Number of states
+                      "States: %{customdata[0]}",  # States that used the data source
+        marker=dict(color='#304A6F')
+    )
+
+    # Update layout to address bar width and y-axis alignment
+    fig.update_layout(
+        title_x=0.5,
+        title_xanchor='center',
+        height=600,  # Increase height to give bars more space
+        yaxis=dict(
+            automargin=True,  # Automatically manage margins to align the labels
+            tickmode='linear'  # Ensure each label is aligned with its corresponding bar
+        ),
+        bargap=0.1  # Adjust gap between bars if needed
+    )
+
+    fig.update_layout(
+        font=dict(
+            family="Poppins",
+            size=16,  # Default font size
+            color="black"  # Default font color
+        ),
+        title={
+            'text': "Distribution of data sources used to identify students hit hardest by COVID-19",
+            'y': 0.95,
+            'x': 0.5,
+            'xanchor': 'center',
+            'yanchor': 'top',
+            'font': dict(size=40, family="Castoro", color="black")  # Override title font
+        },
+        height=600,  # Increase height to give bars more space
+        bargap=0.1  # Adjust gap between bars if needed
+    )
+    return fig
+
+
+# %%
+# What percent of ESSER funds are spent?
+@figure('state_percent_esser_spent', columns=['stateCode', *[col for col, _ in percent_spent_columns]])
+def state_percent_esser_spent(df):
+    fig, dropdown_buttons = dropdown_choropleth(
+        df['stateCode'],
+        [(title, {'z': df[col]}) for col, title in percent_spent_columns],
+        locationmode='USA-states',
+        colorscale="Viridis",
+        colorbar=dict(
+            title="Percentage Spent",
+            tickformat=".0%"
+        ),
+        zmin=0,
+        zmax=1,
+        hovertemplate='<b>%{location}</b><br>' +
+                      'Percentage Spent: %{z:.1%}<extra></extra>'
+    )
+
+    # Update the figure layout with the dropdown
+    fig.update_layout(
+        updatemenus=[
+            dict(
+                active=0,
+                buttons=dropdown_buttons,
+                direction='down',
+                showactive=True,
+                x=0.5,           # Center the dropdown
+                xanchor='center',
+                y=1.0,           # Position at the top
+                yanchor='top',
+                pad={"r": 10, "t": 10},
+                type='dropdown',
+                font=dict(
+                    size=24,      # Increase font size
+                    family="Castoro",
+                    color="black"
+                ),
+            )
+        ],
+        geo=dict(
+            scope='usa',
+            projection=go.layout.geo.Projection(type='albers usa')
+        ),
+        font=dict(
+            family="Poppins",
+            size=16,  # Default font size for the rest of the chart
+            color="black"
+        ),
+        margin=dict(l=50, r=50, t=50, b=50)  # Adjust top margin since title is removed
+    )
+    return fig
+
+
+# %%
+# one map per combined question
+def state_esser_combined(df, column, question):
+    sources = combined_column_sources[column]
+    combined = df[sources[0]] if len(sources) == 1 else df[sources].any(axis=1)
+
+    # Initialize the figure
+    fig = go.Figure()
+
+    # Add a choropleth trace
+    fig.add_trace(go.Choropleth(
+        locations=df['stateCode'],
+        z=combined.map({True: 1, False: 0}),
+        text=combined.map({True: 'Yes', False: 'No'}),  # Use 'Yes'/'No' for hover text
+        locationmode="USA-states",
+        colorscale=yes_no_colorscale,
+        zmin=0,
+        zmax=1,
+        marker_line_color='white',
+        colorbar=dict(
+            title="Response",
+            tickvals=[0, 1],
+            ticktext=['No', 'Yes'],
+            len=0.4,  # Make the colorbar smaller
+            thickness=10,  # Reduce the thickness of the colorbar
+        ),
+        hovertemplate='<b>%{location}</b><br>%{text}<extra></extra>',
+        showscale=True  # Display the legend
+    ))
+
+    # Update the figure layout with the question as the title and set the font to Castoro
+    fig.update_layout(
+        title_text=question,
+        title_x=0.5,
+        title_font=dict(family='Castoro', size=28),  # Castoro font and larger size for the title
+        font=dict(family='Poppins', size=16),  # Use Poppins for other texts
+        margin=dict(l=0, r=0, t=50, b=0),
+        geo=dict(scope='usa'),
+    )
+    return fig
+
+
+for column, question in combined_columns_with_names.items():
+    figure(
+        f'state_esser_combined_{column}',
+        columns=['stateCode', *combined_column_sources[column]],
+        column=column,
+        question=question,
+    )(state_esser_combined)
@@ -0,0 +1,138 @@
+#%%
+# state lookup and map geometry shared by every figure
+#
+# STATES is the one table of state abbreviations, names and FIPS codes.
+#
+# the base maps plotly.js draws for locationmode="USA-states" (usa_110m / usa_50m topojson,
+# already simplified for the two zoom levels plotly uses) can be vendored next to the figures
+# (python -m esser --vendor-maps, once) so pages don't fetch them from cdn.plot.ly. builds never
+# touch the network: pages point at the vendored copies when they're there and at the CDN
+# otherwise. the county GeoJSON used by the sub-state maps is written as quantized GeoJSON at a
+# few coordinate tolerances so each map can reference the coarsest one it needs.
+import json
+import math
+import os
+import urllib.request
+
+import pandas as pd
+
+STATES = pd.DataFrame(
+    [
+        ('AL', 'Alabama', '01'), ('AK', 'Alaska', '02'), ('AZ', 'Arizona', '04'), ('AR', 'Arkansas', '05'),
+        ('CA', 'California', '06'), ('CO', 'Colorado', '08'), ('CT', 'Connecticut', '09'), ('DE', 'Delaware', '10'),
+        ('DC', 'District of Columbia', '11'), ('FL', 'Florida', '12'), ('GA', 'Georgia', '13'), ('HI', 'Hawaii', '15'),
+        ('ID', 'Idaho', '16'), ('IL', 'Illinois', '17'), ('IN', 'Indiana', '18'), ('IA', 'Iowa', '19'),
+        ('KS', 'Kansas', '20'), ('KY', 'Kentucky', '21'), ('LA', 'Louisiana', '22'), ('ME', 'Maine', '23'),
+        ('MD', 'Maryland', '24'), ('MA', 'Massachusetts', '25'), ('MI', 'Michigan', '26'), ('MN', 'Minnesota', '27'),
+        ('MS', 'Mississippi', '28'), ('MO', 'Missouri', '29'), ('MT', 'Montana', '30'), ('NE', 'Nebraska', '31'),
+        ('NV', 'Nevada', '32'), ('NH', 'New Hampshire', '33'), ('NJ', 'New Jersey', '34'), ('NM', 'New Mexico', '35'),
+        ('NY', 'New York', '36'), ('NC', 'North Carolina', '37'), ('ND', 'North Dakota', '38'), ('OH', 'Ohio', '39'),
+        ('OK', 'Oklahoma', '40'), ('OR', 'Oregon', '41'), ('PA', 'Pennsylvania', '42'), ('RI', 'Rhode Island', '44'),
+        ('SC', 'South Carolina', '45'), ('SD', 'South Dakota', '46'), ('TN', 'Tennessee', '47'), ('TX', 'Texas', '48'),
+        ('UT', 'Utah', '49'), ('VT', 'Vermont', '50'), ('VA', 'Virginia', '51'), ('WA', 'Washington', '53'),
+        ('WV', 'West Virginia', '54'), ('WI', 'Wisconsin', '55'), ('WY', 'Wyoming', '56'), ('PR', 'Puerto Rico', '72'),
+    ],
+    columns=['abbreviation', 'name', 'fips'],
+)
+
+state_name = dict(zip(STATES['abbreviation'], STATES['name']))
+
+# plotly.js looks for <topojsonURL><name>.json
+TOPOJSON_URL = 'https://cdn.plot.ly/'
+TOPOJSON_DIR = 'topojson'
+TOPOJSON_NAMES = ('usa_110m', 'usa_50m')
+
+COUNTY_GEOJSON_URL = 'https://raw.githubusercontent.com/plotly/datasets/master/geojson-counties-fips.json'
+GEOMETRY_DIR = 'geometry'
+# grid sizes in degrees (0.01 is roughly 1 km)
+COUNTY_TOLERANCES = (0.05, 0.01, 0.002)
+
+
+def vendor_topojson(out_dir, base_url=TOPOJSON_URL):
+    # download the base maps into out_dir/topojson; raises OSError if they can't be fetched,
+    # and only writes anything once every map has been downloaded
+    maps = {}
+    for name in TOPOJSON_NAMES:
+        with urllib.request.urlopen(f'{base_url}{name}.json', timeout=30) as response:
+            maps[name] = response.read()
+    topojson_dir = os.path.join(out_dir, TOPOJSON_DIR)
+    os.makedirs(topojson_dir, exist_ok=True)
+    for name, data in maps.items():
+        path = os.path.join(topojson_dir, f'{name}.json')
+        with open(f'{path}.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(f'{path}.tmp', path)
+    return [os.path.join(topojson_dir, f'{name}.json') for name in TOPOJSON_NAMES]
+
+
+def topojson_url(out_dir):
+    # the topojsonURL to configure pages with if the base maps are vendored in out_dir, else
+    # None (plotly.js uses the CDN). only looks at the files, so it's the same on every build
+    topojson_dir = os.path.join(out_dir, TOPOJSON_DIR)
+    if all(os.path.exists(os.path.join(topojson_dir, f'{name}.json')) for name in TOPOJSON_NAMES):
+        return f'{TOPOJSON_DIR}/'
+    return None
+
+
+def _quantize_ring(ring, tolerance, decimals):
+    # snap to the grid and drop the points that collapse onto their neighbour
+    points = []
+    for x, y, *_ in ring:
+        point = [round(round(x / tolerance) * tolerance, decimals), round(round(y / tolerance) * tolerance, decimals)]
+        if not points or point != points[-1]:
+            points.append(point)
+    return points if len(points) >= 4 else None
+
+
+def _quantize_polygon(polygon, tolerance, decimals):
+    rings = [_quantize_ring(ring, tolerance, decimals) for ring in polygon]
+    if rings[0] is None:
+        return None
+    return [ring for ring in rings if ring is not None]
+
+
+def quantize_geojson(geojson, tolerance):
+    # a coarser copy of a (Multi)Polygon FeatureCollection; features too small to survive the
+    # grid keep their original shape so no location disappears from the map
+    decimals = max(0, math.ceil(-math.log10(tolerance))) + 1
+    features = []
+    for feature in geojson['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            polygon = _quantize_polygon(geometry['coordinates'], tolerance, decimals)
+            coordinates = polygon if polygon is not None else geometry['coordinates']
+        elif geometry['type'] == 'MultiPolygon':
+            polygons = [_quantize_polygon(polygon, tolerance, decimals) for polygon in geometry['coordinates']]
+            coordinates = [polygon for polygon in polygons if polygon is not None] or geometry['coordinates']
+        else:
+            coordinates = geometry['coordinates']
+        features.append({**feature, 'geometry': {'type': geometry['type'], 'coordinates': coordinates}})
+    return {**geojson, 'features': features}
+
+
+def write_county_geometry(out_dir, source=COUNTY_GEOJSON_URL, tolerances=COUNTY_TOLERANCES):
+    # write out_dir/geometry/counties.<tolerance>.json for each tolerance (skipping ones that
+    # exist) and return {tolerance: path relative to out_dir}
+    paths = {tolerance: f'{GEOMETRY_DIR}/counties.{tolerance:g}.json' for tolerance in tolerances}
+    missing = [tolerance for tolerance, path in paths.items() if not os.path.exists(os.path.join(out_dir, path))]
+    if not missing:
+        return paths
+
+    try:
+        if os.path.exists(source):
+            with open(source, encoding='utf-8') as file:
+                geojson = json.load(file)
+        else:
+            with urllib.request.urlopen(source, timeout=60) as response:
+                geojson = json.load(response)
+    except OSError as error:
+        print(f'Not writing county geometry: {error}')
+        return {}
+
+    os.makedirs(os.path.join(out_dir, GEOMETRY_DIR), exist_ok=True)
+    for tolerance in missing:
+        path = os.path.join(out_dir, paths[tolerance])
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(quantize_geojson(geojson, tolerance), file, separators=(',', ':'))
+        os.replace(f'{path}.tmp', path)
+    return paths
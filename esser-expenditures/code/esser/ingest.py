@@ -0,0 +1,188 @@
+#%%
+# cached ingest for the raw Excel downloads
+#
+# parsing the xlsx files with openpyxl is the slowest step of every run, so each
+# (workbook, sheet) is converted to an Arrow IPC file once and memory-mapped on
+# later runs. the cache is keyed on the sha256 of the workbook bytes and the sheet
+# name, so a new download is picked up automatically.
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from .geometry import state_name
+from .instrument import stage, staged
+from .metrics import AMOUNT_COLUMNS, data_source_columns
+
+CACHE_DIR = './../data/cache'
+RAW_DIR = './../data/raw'
+
+
+# the prime-sheet columns the state figures read, and how each is stored once loaded:
+#   'category' - repeated codes
+#   'boolean'  - the yes/no answers (nullable, one byte per value instead of a Python object)
+#   'amount'   - dollars, float32 when every value survives the round trip, float64 otherwise
+# everything else on the sheet is never read out of the cache.
+award_columns = [
+    'anyEsserASeaDirectActivitiesLearningLoss',
+    'areEsser1SeaFundsAwarded', 'areEsser2SeaFundsAwarded',
+    'areEsser3LearningLossFundsAwarded', 'areEsser3SummerEnrichmentAwarded',
+    'areEsser3AfterschoolProgramsAwarded', 'areEsser3OtherAwarded',
+    'areEsser1SeaNonLeaFundsAwarded', 'areEsser2SeaNonLeaFundsAwarded',
+    'areEsser3NonLeaLearningLossFundsAwarded', 'areEsser3NonLeaSummerEnrichmentAwarded',
+    'areEsser3NonLeaAfterschoolProgramsAwarded', 'areEsser3NonLeaOtherAwarded',
+]
+
+esser_schema = {
+    'stateCode': 'category',
+    **{column: 'amount' for column in AMOUNT_COLUMNS},
+    **{column: 'boolean' for column in award_columns + data_source_columns},
+}
+
+enrollment_schema = {
+    'state': 'string',
+    'Fall 2019': 'integer',
+}
+
+
+def downcast_amount(series):
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    compact = values.astype('float32')
+    if np.array_equal(compact.to_numpy(dtype='float64'), values.to_numpy(), equal_nan=True):
+        return compact
+    return values
+
+
+def apply_schema(df, schema):
+    # project to the schema's columns and store each at its compact dtype
+    df = df[list(schema)].copy()
+    for column, kind in schema.items():
+        if kind == 'amount':
+            df[column] = downcast_amount(df[column])
+        elif kind == 'integer':
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        else:
+            df[column] = df[column].astype(kind)
+    return df
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(path, sheet_name, cache_dir=CACHE_DIR):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    key = hashlib.sha256(f'{file_digest(path)}:{sheet_name}'.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'{stem}.{sheet_name}.{key}.arrow')
+
+
+def read_excel_cached(path, sheet_name=0, refresh=False, cache_dir=CACHE_DIR, columns=None, **kwargs):
+    # refresh=True re-parses the workbook and overwrites the cached copy. the whole sheet is
+    # cached; columns= only reads those columns back out of it
+    from pyarrow import feather
+
+    cached = cache_path(path, sheet_name, cache_dir)
+    if not refresh and os.path.exists(cached):
+        return feather.read_table(cached, columns=columns, memory_map=True).to_pandas()
+
+    df = pd.read_excel(path, sheet_name=sheet_name, **kwargs)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # drop stale entries for this workbook/sheet before writing the new one
+    prefix = os.path.basename(cached).rsplit('.', 2)[0] + '.'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith('.arrow'):
+            os.remove(os.path.join(cache_dir, name))
+
+    with stage(f'cache:{os.path.basename(path)}', sheet=sheet_name) as event:
+        # object columns mixing types (numbers and text in one column) can't be written to
+        # Arrow, so they're cached as strings; the frame returned is the same one later runs read
+        mixed = mixed_type_columns(df)
+        if mixed:
+            df[mixed] = df[mixed].astype('string')
+            event['coerced_to_string'] = mixed
+        feather.write_feather(df, f'{cached}.tmp', compression='uncompressed')
+        os.replace(f'{cached}.tmp', cached)
+    return df[columns] if columns else df
+
+
+def mixed_type_columns(df):
+    import pyarrow as pa
+
+    mixed = []
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            mixed.append(column)
+    return mixed
+
+
+def require_columns(found, columns, source):
+    # found is a frame or a header row. the column names we read by are assumptions about
+    # files we don't control, so a missing one stops the run with the headers that were found
+    found = [str(name) for name in found]
+    missing = [column for column in columns if column not in found]
+    if missing:
+        raise ValueError(f'{source} is missing columns {missing}; found {found}')
+
+
+def iter_sheet_chunks(path, sheet_name=None, chunksize=50_000, usecols=None):
+    # stream a large sheet as DataFrames of at most chunksize rows instead of parsing it whole
+    if path.endswith('.csv'):
+        require_columns(pd.read_csv(path, nrows=0).columns, usecols or [], path)
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=usecols)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(name).strip() for name in next(rows)]
+        require_columns(header, usecols or [], f'{path} [{sheet.title}]')
+        keep = [i for i, name in enumerate(header) if usecols is None or name in usecols]
+        columns = [header[i] for i in keep]
+
+        batch = []
+        for row in rows:
+            batch.append([row[i] for i in keep])
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+@staged('read')
+def read_state_inputs(refresh=False, raw_dir=RAW_DIR):
+    # the raw (esser, enrollment) frames; only the esser_schema columns are read from the prime sheet
+    df_esser = read_excel_cached(f'{raw_dir}/esser-federal-data.xlsx', sheet_name='prime', refresh=refresh, columns=list(esser_schema)) # data from https://covid-relief-data.ed.gov/data-download
+    df_enrollment = read_excel_cached(f'{raw_dir}/enrollment.xlsx', refresh=refresh) # data from https://nces.ed.gov/programs/digest/d23/tables/dt23_203.20.asp
+    return df_esser, df_enrollment
+
+
+def merge_state_data(df_esser, df_enrollment):
+    # clean both frames to their schemas and merge them, one row per state (PR dropped).
+    # no file I/O, and the frames passed in aren't modified
+    df_enrollment = df_enrollment.set_axis(df_enrollment.columns.str.strip(), axis=1)
+    df_esser = apply_schema(df_esser[df_esser['stateCode'] != 'PR'], esser_schema)
+    df_enrollment = apply_schema(df_enrollment, enrollment_schema)
+    df_esser['stateCode'] = df_esser['stateCode'].cat.remove_unused_categories()
+    df_esser['state'] = df_esser['stateCode'].map(state_name).astype('string').str.strip()
+    df_enrollment['state'] = df_enrollment['state'].str.strip()
+    return pd.merge(df_esser, df_enrollment, on='state')
+
+
+@staged('load')
+def load_state_data(refresh=False, raw_dir=RAW_DIR):
+    # only the columns in esser_schema/enrollment_schema are read, at their compact dtypes
+    return merge_state_data(*read_state_inputs(refresh, raw_dir))
@@ -0,0 +1,119 @@
+#%%
+# stage-level timing and memory events
+#
+# wrap a stage in `with stage('load'):` (or decorate it with @staged('load')) and, when a log
+# is configured, it appends one json line with the stage name, wall time, peak RSS so far and
+# whatever the stage adds to the event it's given (bytes written, rows, ...). one stage can
+# also be captured in detail: run under cProfile (stats dumped next to the log) or traced with
+# tracemalloc (its top allocation sites go into the event).
+#
+# settings live in environment variables so render workers pick them up too:
+#   ESSER_STAGE_LOG      path of the json-lines log (unset: no events)
+#   ESSER_PROFILE_STAGE  fnmatch pattern of the stage(s) to profile, e.g. 'build:state_esser_uses'
+#   ESSER_TRACE_STAGE    fnmatch pattern of the stage(s) to trace allocations for
+import contextlib
+import fnmatch
+import functools
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # windows: events go without peak RSS
+    resource = None
+
+LOG_VARIABLE = 'ESSER_STAGE_LOG'
+PROFILE_VARIABLE = 'ESSER_PROFILE_STAGE'
+TRACE_VARIABLE = 'ESSER_TRACE_STAGE'
+
+# allocation sites kept for a traced stage
+TOP_ALLOCATIONS = 10
+
+
+def configure(log=None, profile=None, trace=None):
+    # only the settings given are changed, so ones already set in the environment still apply
+    for variable, value in ((LOG_VARIABLE, log), (PROFILE_VARIABLE, profile), (TRACE_VARIABLE, trace)):
+        if value:
+            os.environ[variable] = value
+
+
+def peak_rss_mb():
+    # ru_maxrss is KB on linux, bytes on macOS; None where there's no resource module
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / (1 << 10)
+
+
+def _matches(variable, name):
+    pattern = os.environ.get(variable)
+    return bool(pattern) and fnmatch.fnmatchcase(name, pattern)
+
+
+def _emit(event):
+    path = os.environ.get(LOG_VARIABLE)
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # one write per line in append mode, so workers sharing the log don't interleave lines
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(event, default=str) + '\n')
+
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    # yields the event dict; anything the stage puts in it is logged with the timings
+    event = {'stage': name, **fields}
+    profiler = None
+    if _matches(PROFILE_VARIABLE, name):
+        import cProfile
+        profiler = cProfile.Profile()
+    tracing = _matches(TRACE_VARIABLE, name) and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    event['started'] = time.time()
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield event
+    except BaseException as error:
+        event['error'] = repr(error)
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        event['seconds'] = time.perf_counter() - start
+        if resource is not None:
+            event['peak_rss_mb'] = peak_rss_mb()
+        event['pid'] = os.getpid()
+        if tracing:
+            event['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / (1 << 20)
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+            tracemalloc.stop()
+            event['top_allocations'] = [
+                {'where': str(statistic.traceback[0]), 'mb': statistic.size / (1 << 20), 'count': statistic.count}
+                for statistic in statistics
+            ]
+        if profiler:
+            log_dir = os.path.dirname(os.environ.get(LOG_VARIABLE) or '') or '.'
+            path = os.path.join(log_dir, re.sub(r'[^\w.-]+', '_', name) + '.prof')
+            profiler.dump_stats(path)
+            event['profile'] = path
+        _emit(event)
+
+
+def staged(name):
+    # decorator form of stage(); the wrapped function doesn't see the event
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,104 @@
+#%%
+# LEA (school district) level aggregation
+#
+# the subrecipient sheets in the covid-relief-data download have hundreds of thousands
+# of rows, so they're streamed in chunks and reduced with groupby: each chunk is summed
+# per LEA, and the partial sums are combined at the end. the state rollup is summed from
+# the LEA frame, so both levels come out of the same pass over the data.
+import numpy as np
+import pandas as pd
+
+from .ingest import iter_sheet_chunks, require_columns
+from .metrics import AMOUNT_COLUMNS, ESSER_METRICS, DerivedMetrics, add_esser_metrics
+
+# column names in the subrecipient sheet and the NCES LEA directory. they're checked against
+# the files' headers as they're read (see require_columns), so a renamed column stops the run
+# with the headers that were found instead of quietly producing empty figures
+STATE_COLUMN = 'stateCode'
+LEA_ID_COLUMN = 'leaNcesId'
+LEA_NAME_COLUMN = 'leaName'
+COUNTY_COLUMN = 'countyFips'
+ENROLLMENT_COLUMN = 'enrollment'
+DIRECTORY_COLUMNS = [LEA_ID_COLUMN, LEA_NAME_COLUMN, COUNTY_COLUMN, ENROLLMENT_COLUMN]
+
+# added by rollup(): the allocation of the LEAs with a reported enrollment (the numerator of
+# expenditure_per_student) and its share of the whole allocation
+ENROLLED_ALLOCATED_COLUMN = 'enrolledAmountAllocated'
+ENROLLED_SHARE_COLUMN = 'enrolledShare'
+
+# the registered state figures (figures.py) that only need the amounts and enrollment, and the
+# figure metrics they read on top of ESSER_METRICS; the rest need the prime sheet's answers
+STATE_FIGURES = [
+    'state-esser-allocations', 'state-esser-allocations-histogram',
+    'state-esser-allocations-per-student', 'state-esser-allocations-per-student-histogram',
+    'state_percent_esser_spent',
+]
+STATE_FIGURE_METRICS = ['expenditure_per_student_numeric', 'rank']
+
+
+def aggregate_leas(chunks):
+    partials = []
+    for chunk in chunks:
+        chunk[AMOUNT_COLUMNS] = chunk[AMOUNT_COLUMNS].apply(pd.to_numeric, errors='coerce')
+        # ids are normalized before grouping, so a district read as 123 in one chunk and
+        # '0000123' in another is one LEA
+        chunk[LEA_ID_COLUMN] = zero_padded(chunk[LEA_ID_COLUMN], 7)
+        partials.append(
+            chunk.groupby([STATE_COLUMN, LEA_ID_COLUMN], sort=False, dropna=False)[AMOUNT_COLUMNS].sum(min_count=1)
+        )
+    df_lea = pd.concat(partials).groupby(level=[0, 1], dropna=False).sum(min_count=1).reset_index()
+    df_lea[STATE_COLUMN] = df_lea[STATE_COLUMN].astype('category')
+    return df_lea
+
+
+def read_lea_amounts(path, sheet_name=None, chunksize=50_000):
+    usecols = [STATE_COLUMN, LEA_ID_COLUMN] + AMOUNT_COLUMNS
+    return aggregate_leas(iter_sheet_chunks(path, sheet_name, chunksize=chunksize, usecols=usecols))
+
+
+def zero_padded(series, width):
+    # NCES LEA ids (7 digits) and county FIPS codes (5 digits) often lose their leading zeros in Excel
+    return pd.to_numeric(series, errors='coerce').astype('Int64').astype('string').str.zfill(width)
+
+
+def add_lea_directory(df_lea, df_directory):
+    # attach name, county and enrollment from the NCES directory; returns a new frame
+    require_columns(df_directory, DIRECTORY_COLUMNS, 'the LEA directory')
+    df_directory = df_directory[DIRECTORY_COLUMNS].copy()
+    df_directory[LEA_ID_COLUMN] = zero_padded(df_directory[LEA_ID_COLUMN], 7)
+    df_directory[COUNTY_COLUMN] = zero_padded(df_directory[COUNTY_COLUMN], 5)
+    df_lea = df_lea.assign(**{LEA_ID_COLUMN: zero_padded(df_lea[LEA_ID_COLUMN], 7)})
+    df_lea = df_lea.merge(df_directory, on=LEA_ID_COLUMN, how='left')
+    # LEAs without reported enrollment would divide by zero
+    df_lea[ENROLLMENT_COLUMN] = df_lea[ENROLLMENT_COLUMN].replace(0, np.nan)
+    return df_lea
+
+
+def rollup(df_lea, by, names=ESSER_METRICS):
+    # amounts are summed over every LEA, but per-student spending only over the LEAs with a
+    # reported enrollment: the others' dollars would be divided among students who aren't
+    # counted. ENROLLED_SHARE_COLUMN says how much of the allocation that covers
+    enrolled = df_lea[ENROLLMENT_COLUMN] > 0
+    allocated = DerivedMetrics(df_lea, ENROLLMENT_COLUMN)['esserAllocated']
+    df_lea = df_lea.assign(**{
+        ENROLLMENT_COLUMN: df_lea[ENROLLMENT_COLUMN].where(enrolled),
+        ENROLLED_ALLOCATED_COLUMN: allocated.where(enrolled),
+    })
+    columns = AMOUNT_COLUMNS + [ENROLLMENT_COLUMN, ENROLLED_ALLOCATED_COLUMN]
+    df_rollup = df_lea.groupby(by, sort=True, observed=True)[columns].sum(min_count=1).reset_index()
+
+    metrics = DerivedMetrics(df_rollup, ENROLLMENT_COLUMN)
+    metrics['expenditure_per_student'] = df_rollup[ENROLLED_ALLOCATED_COLUMN] / df_rollup[ENROLLMENT_COLUMN]
+    df_rollup = metrics.add_columns(names)
+    df_rollup[ENROLLED_SHARE_COLUMN] = df_rollup[ENROLLED_ALLOCATED_COLUMN] / df_rollup['esserAllocated']
+    return df_rollup
+
+
+def lea_metrics(df_lea_amounts, df_directory):
+    # returns (lea, county, state) frames carrying the same derived metrics as state-level.py.
+    # the state frame also has the per-student figure columns, so the amount-based state
+    # figures (STATE_FIGURES) can be built from it
+    df_lea = add_esser_metrics(add_lea_directory(df_lea_amounts, df_directory), enrollment_column=ENROLLMENT_COLUMN)
+    df_county = rollup(df_lea, [STATE_COLUMN, COUNTY_COLUMN])
+    df_state = rollup(df_lea, STATE_COLUMN, ESSER_METRICS + STATE_FIGURE_METRICS)
+    return df_lea, df_county, df_state
@@ -0,0 +1,201 @@
+#%%
+# derived ESSER metrics shared by the state and LEA pipelines
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .instrument import staged
+
+ESSER_ROUNDS = (1, 2, 3)
+
+ALLOCATED_COLUMNS = [f'esser{n}GrantAmountAllocated' for n in ESSER_ROUNDS]
+REMAINING_COLUMNS = [f'esser{n}GrantAmountRemaining' for n in ESSER_ROUNDS]
+AMOUNT_COLUMNS = ALLOCATED_COLUMNS + REMAINING_COLUMNS
+
+# the enrollment column's name differs between the state ('Fall 2019') and LEA frames, so
+# metrics refer to it by this name and DerivedMetrics maps it onto the frame's column
+ENROLLMENT = 'enrollment'
+
+
+# data sources used to identify students disproportionately impacted by COVID-19
+data_source_columns = [
+    'isEsserAIdentifiedByStudentDemographic',
+    'isEsserAIdentifiedByStudentOutcome',
+    'isEsserAIdentifiedByOtherStudentOutcome',
+    'isEsserAIdentifiedByMissedDays',
+    'isEsserAIdentifiedByOpportunityToLearn',
+    'isEsserAIdentifiedByStateAdministrativeData',
+    'isEsserAIdentifiedByHealthData',
+    'isEsserAIdentifiedByStakeholderInput',
+    'isEsserAIdentifiedByOtherData'
+]
+
+# Mapping for natural language abbreviations
+data_source_mapping = {
+    'isEsserAIdentifiedByStudentDemographic': 'Student Demographic',
+    'isEsserAIdentifiedByStudentOutcome': 'Student Outcome',
+    'isEsserAIdentifiedByOtherStudentOutcome': 'Other Student Outcome',
+    'isEsserAIdentifiedByMissedDays': 'Missed Days',
+    'isEsserAIdentifiedByOpportunityToLearn': 'Opportunity to Learn',
+    'isEsserAIdentifiedByStateAdministrativeData': 'State Administrative Data',
+    'isEsserAIdentifiedByHealthData': 'Health Data',
+    'isEsserAIdentifiedByStakeholderInput': 'Stakeholder Input',
+    'isEsserAIdentifiedByOtherData': 'Other Data'
+}
+
+
+# List the data sources each state used (hover text) and the states using each source (bar chart).
+# Works on a boolean matrix instead of a row-wise apply: each distinct combination of sources is
+# joined once and broadcast back to the rows, so the cost doesn't grow with per-row Python loops.
+def get_data_sources_used(df, columns, labels, key='stateCode'):
+    mask = (df[columns] == 1).to_numpy(dtype=bool, na_value=False)
+    labels = np.asarray(labels, dtype=object)
+    patterns, inverse = np.unique(mask, axis=0, return_inverse=True)
+    joined = np.array([', '.join(labels[pattern]) for pattern in patterns], dtype=object)
+    sources_used = pd.Series(joined[inverse.reshape(-1)], index=df.index)
+
+    keys = df[key].to_numpy()
+    users_by_source = {column: ', '.join(keys[mask[:, i]]) for i, column in enumerate(columns)}
+    return sources_used, users_by_source
+
+
+# derived metrics
+#
+# each metric is registered with the columns (or other metrics) it's computed from, like the
+# figures in build.py. DerivedMetrics computes one the first time it's asked for and keeps it;
+# setting a column through it drops only the cached metrics that depend on that column.
+MetricSpec = namedtuple('MetricSpec', ['name', 'compute', 'inputs'])
+
+METRICS = {}
+
+
+def metric(name, inputs):
+    # register compute(df) -> Series; df only carries the declared inputs
+    def register(compute):
+        METRICS[name] = MetricSpec(name, compute, tuple(inputs))
+        return compute
+    return register
+
+
+def dependents(column):
+    # the metrics computed from column, directly or through other metrics
+    found = set()
+    pending = [column]
+    while pending:
+        name = pending.pop()
+        for spec in METRICS.values():
+            if name in spec.inputs and spec.name not in found:
+                found.add(spec.name)
+                pending.append(spec.name)
+    return found
+
+
+class DerivedMetrics:
+    # the registered metrics over one frame: metrics['rank'] computes rank (and whatever it's
+    # computed from) once and memoizes it. set input columns through metrics[column] = values
+    # so the metrics depending on them are recomputed, or call invalidate(column) after
+    # changing the frame directly. a metric set this way is taken as given from then on
+    # rather than computed, so metrics['esserAllocated'] = 0.0 feeds the per-student metrics.
+    def __init__(self, df, enrollment_column='Fall 2019'):
+        self.df = df
+        self.columns = {ENROLLMENT: enrollment_column}
+        self._cache = {}
+        self._overridden = set()
+
+    def __getitem__(self, name):
+        if name not in METRICS or name in self._overridden:
+            return self.df[self.columns.get(name, name)]
+        if name not in self._cache:
+            spec = METRICS[name]
+            inputs = pd.DataFrame({column: self[column] for column in spec.inputs}, index=self.df.index)
+            self._cache[name] = spec.compute(inputs)
+        return self._cache[name]
+
+    def __setitem__(self, column, values):
+        self.df[self.columns.get(column, column)] = values
+        if column in METRICS:
+            self._overridden.add(column)
+        self.invalidate(column)
+
+    def invalidate(self, column):
+        # drops column's own cached value and those of every metric computed from it
+        names = {column, *(name for name, actual in self.columns.items() if actual == column)}
+        for name in names.union(*map(dependents, names)):
+            self._cache.pop(name, None)
+
+    def add_columns(self, names):
+        # write the named metrics into the frame (computing only what they need) and return it
+        for name in names:
+            self.df[name] = self[name]
+        return self.df
+
+
+# the inputs of these are positional: one column per ESSER round, and (remaining, allocated)
+@metric('esserAllocated', ALLOCATED_COLUMNS)
+@metric('totalAmountAllocated', ALLOCATED_COLUMNS)
+@metric('totalAmountRemaining', REMAINING_COLUMNS)
+def sum_of_rounds(df):
+    esser1, esser2, esser3 = (df[column] for column in df.columns)
+    return esser1 + esser2 + esser3
+
+
+def spent_share(df):
+    remaining, allocated = (df[column] for column in df.columns)
+    return 1 - (remaining / allocated)
+
+
+for n in ESSER_ROUNDS:
+    metric(f'esser{n}expendpercent', [f'esser{n}GrantAmountRemaining', f'esser{n}GrantAmountAllocated'])(spent_share)
+metric('totalesserspent', ['totalAmountRemaining', 'totalAmountAllocated'])(spent_share)
+
+
+@metric('expenditure_per_student', ['esserAllocated', ENROLLMENT])
+def expenditure_per_student(df):
+    return df['esserAllocated'] / df[ENROLLMENT]
+
+
+@metric('expenditure_per_student_numeric', ['expenditure_per_student'])
+def expenditure_per_student_numeric(df):
+    # to the cent, as shown in the hover text. vectorized rather than round() per row; numpy
+    # can land a cent away from round() on a value sitting exactly on a half cent, which
+    # amounts over enrollments don't hit in practice (see tests/test_metrics.py)
+    return df['expenditure_per_student'].round(2)
+
+
+@metric('rank', ['expenditure_per_student_numeric'])
+def rank(df):
+    # 1 for the highest per-student spending, len(df) for the lowest (rows without enrollment last)
+    return df['expenditure_per_student_numeric'].rank(ascending=False, na_option='bottom').astype(int)
+
+
+@metric('data_source_score', data_source_columns)
+def data_source_score(df):
+    # number of data sources used
+    return df.sum(axis=1).astype(float)
+
+
+@metric('data_sources_used', ['stateCode', *data_source_columns])
+def data_sources_used(df):
+    sources_used, _ = get_data_sources_used(
+        df, data_source_columns, [data_source_mapping[col] for col in data_source_columns]
+    )
+    return sources_used
+
+
+ESSER_METRICS = [
+    'esserAllocated', 'esser1expendpercent', 'esser2expendpercent', 'esser3expendpercent',
+    'totalAmountRemaining', 'totalAmountAllocated', 'expenditure_per_student', 'totalesserspent',
+]
+FIGURE_METRICS = ['expenditure_per_student_numeric', 'rank', 'data_source_score', 'data_sources_used']
+
+
+@staged('metrics')
+def add_esser_metrics(df, enrollment_column='Fall 2019'):
+    return DerivedMetrics(df, enrollment_column).add_columns(ESSER_METRICS)
+
+
+@staged('figure_columns')
+def add_figure_columns(df):
+    # per-student spending to the cent and its rank, data source counts and lists
+    return DerivedMetrics(df).add_columns(FIGURE_METRICS)
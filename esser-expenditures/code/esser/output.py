@@ -0,0 +1,387 @@
+#%%
+# writing figures to html
+#
+# every page used to inline its own ~3.6 MB copy of plotly.js. by default we now
+# write one versioned, content-hashed plotly.min.js next to the figures and point
+# each page at it, so browsers download and cache the library once. pages are written
+# from PAGE_TEMPLATE rather than fig.write_html so the figure json can be encoded
+# compactly (see encode_categoricals) and decoded in the browser.
+import hashlib
+import html
+import json
+import math
+import os
+import re
+
+from . import geometry
+
+# 'shared': self-hosted plotly.js next to the figures (works offline)
+# 'cdn': load plotly.js from cdn.plot.ly
+# 'inline': embed plotly.js in every page (the old behaviour)
+PLOTLYJS_MODE = 'shared'
+
+
+def plotlyjs_bundle(out_dir):
+    # write plotly-<version>.<hash>.min.js into out_dir once and return its file name
+    from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+    source = get_plotlyjs()
+    digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+    name = f'plotly-{get_plotlyjs_version()}.{digest}.min.js'
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(out_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(source)
+        os.replace(tmp_path, path)
+    return name
+
+
+def plotlyjs_tag(filename, mode=None, bundle_dir=None):
+    # the <script> that loads plotly.js for the page at filename. the shared bundle is written
+    # to bundle_dir (the page's own directory by default) and referenced relative to the page,
+    # so pages in a subdirectory (lea-rollup/) can load the one next to the top-level figures
+    mode = mode or PLOTLYJS_MODE
+    if mode == 'shared':
+        page_dir = os.path.dirname(filename) or '.'
+        name = plotlyjs_bundle(bundle_dir or page_dir)
+        src = os.path.relpath(os.path.join(bundle_dir or page_dir, name), page_dir).replace(os.sep, '/')
+        return f'<script charset="utf-8" src="{src}"></script>'
+    if mode == 'cdn':
+        from plotly.offline import get_plotlyjs_version
+        return f'<script charset="utf-8" src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    if mode == 'inline':
+        from plotly.offline import get_plotlyjs
+        return f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    raise ValueError(f'Unknown plotly.js mode: {mode!r}')
+
+
+def figure_config(out_dir):
+    # plotly.js config shared by the pages and the dashboard: draw the state maps from the
+    # vendored topojson (see geometry.vendor_topojson) instead of fetching it from cdn.plot.ly
+    topojson_url = geometry.topojson_url(out_dir)
+    return {'topojsonURL': topojson_url} if topojson_url else {}
+
+
+# repeated hover strings (Yes/No, data source lists, state codes in customdata, ...) are written
+# once: an array of strings becomes {"values": [distinct strings], "codes": [index per point]}
+# (-1 for null), and 2-d customdata becomes {"columns": [...]} with each string column encoded
+# the same way. the per-trace arrays in the args of restyle buttons (dropdown maps) are
+# encoded too. the pages decode them before handing the spec to Plotly.newPlot.
+ENCODED_ATTRIBUTES = ('customdata', 'text', 'hovertext')
+
+
+def _encode_column(values):
+    if not values or not all(value is None or isinstance(value, str) for value in values):
+        return values
+    distinct = list(dict.fromkeys(value for value in values if value is not None))
+    if 2 * len(distinct) > len(values):
+        return values
+    index = {value: i for i, value in enumerate(distinct)}
+    return {'values': distinct, 'codes': [-1 if value is None else index[value] for value in values]}
+
+
+def encode_categoricals(spec):
+    # spec is the figure's json dict; encodes it in place and returns it
+    for trace in spec.get('data', []):
+        for attribute in ENCODED_ATTRIBUTES:
+            values = trace.get(attribute)
+            if not isinstance(values, list) or not values:
+                continue
+            if all(isinstance(row, list) for row in values):
+                columns = [_encode_column([row[i] if i < len(row) else None for row in values])
+                           for i in range(max(len(row) for row in values))]
+                if any(isinstance(column, dict) for column in columns):
+                    trace[attribute] = {'columns': columns}
+            else:
+                trace[attribute] = _encode_column(values)
+    for restyle in _restyle_args(spec):
+        for attribute in ENCODED_ATTRIBUTES:
+            if isinstance(restyle.get(attribute), list):
+                restyle[attribute] = [_encode_column(values) if isinstance(values, list) else values
+                                      for values in restyle[attribute]]
+    return spec
+
+
+def _restyle_args(spec):
+    # the {attribute: [value per trace]} dict of every restyle button
+    for menu in spec.get('layout', {}).get('updatemenus', []):
+        for button in menu.get('buttons', []):
+            if button.get('method') == 'restyle' and button.get('args'):
+                yield button['args'][0]
+
+
+def _decode_column(column):
+    if not isinstance(column, dict):
+        return column
+    return [None if code < 0 else column['values'][code] for code in column['codes']]
+
+
+def decode_categoricals(spec):
+    # inverse of encode_categoricals, for reading specs back in python
+    for trace in spec.get('data', []):
+        for attribute in ENCODED_ATTRIBUTES:
+            value = trace.get(attribute)
+            if isinstance(value, dict) and 'codes' in value:
+                trace[attribute] = _decode_column(value)
+            elif isinstance(value, dict) and 'columns' in value:
+                trace[attribute] = [list(row) for row in zip(*map(_decode_column, value['columns']))]
+    for restyle in _restyle_args(spec):
+        for attribute in ENCODED_ATTRIBUTES:
+            if isinstance(restyle.get(attribute), list):
+                restyle[attribute] = [_decode_column(values) for values in restyle[attribute]]
+    return spec
+
+
+DECODE_SCRIPT = """function decodeColumn(column) {
+    if (!column || !column.codes) return column;
+    return column.codes.map(function (code) { return code < 0 ? null : column.values[code]; });
+}
+function decodeFigure(spec) {
+    spec.data.forEach(function (trace) {
+        ['customdata', 'text', 'hovertext'].forEach(function (attribute) {
+            var value = trace[attribute];
+            if (value && value.codes) {
+                trace[attribute] = decodeColumn(value);
+            } else if (value && value.columns) {
+                var columns = value.columns.map(decodeColumn);
+                trace[attribute] = columns[0].map(function (_, i) {
+                    return columns.map(function (column) { return column[i]; });
+                });
+            }
+        });
+    });
+    (spec.layout.updatemenus || []).forEach(function (menu) {
+        (menu.buttons || []).forEach(function (button) {
+            if (button.method !== 'restyle' || !button.args) return;
+            ['customdata', 'text', 'hovertext'].forEach(function (attribute) {
+                var value = button.args[0][attribute];
+                if (Array.isArray(value)) button.args[0][attribute] = value.map(decodeColumn);
+            });
+        });
+    });
+    return spec;
+}"""
+
+
+# output is byte-for-byte deterministic: div ids come from the figure's name, json keys are
+# sorted and floats are written with FLOAT_DIGITS significant digits, so a value recomputed
+# with last-bit noise doesn't change the file. files whose bytes are unchanged aren't
+# rewritten at all (write_bytes), so their mtimes, etags and cache entries survive a rebuild.
+FLOAT_DIGITS = 15
+
+
+def _fixed_floats(value):
+    if isinstance(value, float):
+        return float(f'{value:.{FLOAT_DIGITS}g}') if math.isfinite(value) else value
+    if isinstance(value, list):
+        return [_fixed_floats(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _fixed_floats(item) for key, item in value.items()}
+    return value
+
+
+# the json is pasted into inline <script>s, so (like plotly's own encoder) <, > and & are
+# written as unicode escapes: a '</script>' or '<!--' in a title or hover name can't end the
+# script early. the escapes are still plain json for the specs fetched by the dashboard
+_SCRIPT_ESCAPES = {ord('<'): '\\u003c', ord('>'): '\\u003e', ord('&'): '\\u0026'}
+
+
+def script_json(value, **kwargs):
+    return json.dumps(value, sort_keys=True, **kwargs).translate(_SCRIPT_ESCAPES)
+
+
+def figure_json(fig):
+    spec = _fixed_floats(encode_categoricals(json.loads(fig.to_json())))
+    return script_json(spec, separators=(',', ':'))
+
+
+def div_id(filename):
+    return re.sub(r'[^\w-]+', '-', os.path.splitext(os.path.basename(filename))[0])
+
+
+def write_bytes(filename, data):
+    # returns whether the file changed
+    if os.path.exists(filename) and os.path.getsize(filename) == len(data):
+        with open(filename, 'rb') as file:
+            if file.read() == data:
+                return False
+    tmp_path = f'{filename}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, filename)
+    return True
+
+
+PAGE_TEMPLATE = """<html>
+<head><meta charset="utf-8" /></head>
+<body>
+<div id="{div_id}" class="plotly-graph-div" style="height:100%; width:100%;"></div>
+{plotlyjs}
+<script type="text/javascript">
+{decode}
+var spec = decodeFigure({spec});
+Plotly.newPlot('{div_id}', spec.data, spec.layout, {config});
+</script>
+</body>
+</html>
+"""
+
+
+def write_figure(fig, filename, mode=None, config=None, bundle_dir=None):
+    if config is None:
+        config = figure_config(os.path.dirname(filename) or '.')
+    config = {'responsive': True, **config}
+    page = PAGE_TEMPLATE.format(
+        div_id=div_id(filename),
+        plotlyjs=plotlyjs_tag(filename, mode, bundle_dir),
+        decode=DECODE_SCRIPT,
+        spec=figure_json(fig),
+        config=script_json(config),
+    )
+    write_bytes(filename, page.encode('utf-8'))
+    return filename
+
+
+DASHBOARD_TEMPLATE = """<html>
+<head>
+<meta charset="utf-8" />
+<title>{title}</title>
+<style>
+body {{ margin: 0; font-family: Poppins, sans-serif; }}
+nav {{ position: sticky; top: 0; z-index: 10; background: white; padding: 8px 16px; border-bottom: 1px solid #ddd; }}
+nav select {{ max-width: 100%; font-family: inherit; font-size: 16px; }}
+section {{ padding: 16px; }}
+.figure {{ width: 100%; }}
+</style>
+</head>
+<body>
+<nav><select id="figure-select">
+<option value="">Jump to a figure</option>
+{options}
+</select></nav>
+{sections}
+{plotlyjs}
+<script type="text/javascript">
+// figure specs are fetched and plotted only when they scroll into view or are picked from the nav
+var config = {config};
+{decode}
+function loadFigure(el) {{
+    if (el.dataset.loaded) return;
+    el.dataset.loaded = '1';
+    fetch(el.dataset.spec)
+        .then(function (response) {{ return response.json(); }})
+        .then(function (spec) {{
+            el.style.minHeight = '';
+            decodeFigure(spec);
+            Plotly.newPlot(el, spec.data, spec.layout, Object.assign({{responsive: true}}, config, spec.config || {{}}));
+        }});
+}}
+var observer = new IntersectionObserver(function (entries) {{
+    entries.forEach(function (entry) {{
+        if (entry.isIntersecting) {{
+            observer.unobserve(entry.target);
+            loadFigure(entry.target);
+        }}
+    }});
+}}, {{rootMargin: '200px'}});
+document.querySelectorAll('.figure').forEach(function (el) {{ observer.observe(el); }});
+document.getElementById('figure-select').addEventListener('change', function (event) {{
+    var section = document.getElementById(event.target.value);
+    if (!section) return;
+    loadFigure(section.querySelector('.figure'));
+    section.scrollIntoView();
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def write_spec(fig, filename):
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+    write_bytes(filename, figure_json(fig).encode('utf-8'))
+    return filename
+
+
+def read_spec(filename):
+    import plotly.graph_objects as go
+
+    with open(filename, encoding='utf-8') as file:
+        return go.Figure(decode_categoricals(json.load(file)))
+
+
+# static images in <out_dir>/img/ for link previews (og:image) and low-bandwidth clients. the
+# first size is written as img/<name>.<format>, the others as img/<name>-<width>x<height>.<format>
+THUMBNAIL_SIZES = [(1200, 630), (600, 315)]
+THUMBNAIL_FORMATS = ('png', 'webp')
+
+
+def thumbnail_paths(out_dir, name, sizes=None, formats=THUMBNAIL_FORMATS):
+    sizes = THUMBNAIL_SIZES if sizes is None else sizes
+    for i, (width, height) in enumerate(sizes):
+        stem = name if i == 0 else f'{name}-{width}x{height}'
+        for image_format in formats:
+            yield os.path.join(out_dir, 'img', f'{stem}.{image_format}'), image_format, width, height
+
+
+def thumbnails_available():
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def missing_thumbnails(out_dir, name, sizes=None, formats=THUMBNAIL_FORMATS):
+    return [path for path, *_ in thumbnail_paths(out_dir, name, sizes, formats) if not os.path.exists(path)]
+
+
+def write_thumbnails(figs, out_dir, sizes=None, formats=THUMBNAIL_FORMATS):
+    # render {name: fig} with kaleido. all images go through the one kaleido (chromium) process
+    # plotly.io keeps alive for the session, so it's started once per batch rather than per image
+    if not thumbnails_available():
+        print('kaleido is not installed; not writing thumbnails')
+        return []
+
+    import plotly.io as pio
+
+    written = []
+    os.makedirs(os.path.join(out_dir, 'img'), exist_ok=True)
+    for name, fig in figs.items():
+        for path, image_format, width, height in thumbnail_paths(out_dir, name, sizes, formats):
+            write_bytes(path, pio.to_image(fig, format=image_format, width=width, height=height))
+            written.append(path)
+    return written
+
+
+def dashboard_entry(fig, name):
+    # what the dashboard shell needs to know about a figure without loading its spec
+    title = fig.layout.title.text
+    return {'title': title.strip() if title else name, 'height': fig.layout.height or 450}
+
+
+def write_dashboard(entries, filename, title='Where did the ESSER money go?', spec_dir='specs', mode=None,
+                    bundle_dir=None):
+    # one shell page; each figure's json spec (written by write_spec) is loaded lazily in the browser
+    options = []
+    sections = []
+    for name, entry in entries.items():
+        spec = f'{spec_dir}/{name}.json'
+        options.append(f'<option value="{name}">{html.escape(entry["title"])}</option>')
+        sections.append(
+            f'<section id="{name}"><div class="figure" data-spec="{spec}" style="min-height:{entry["height"]}px"></div></section>'
+        )
+
+    out_dir = os.path.dirname(filename) or '.'
+    page = DASHBOARD_TEMPLATE.format(
+        title=html.escape(title),
+        options='\n'.join(options),
+        sections='\n'.join(sections),
+        plotlyjs=plotlyjs_tag(filename, mode, bundle_dir),
+        config=script_json(figure_config(out_dir)),
+        decode=DECODE_SCRIPT,
+    )
+    write_bytes(filename, page.encode('utf-8'))
+    return filename
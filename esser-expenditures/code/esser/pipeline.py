@@ -0,0 +1,77 @@
+#%%
+# command-line entry point for regenerating the state-level figures (CI / cron)
+#
+#   cd esser-expenditures/code
+#   python -m esser --headless                         # every figure whose inputs changed
+#   python -m esser --headless --figures state_data_used state_percent_esser_spent
+#   python -m esser --headless --workers 0             # render across every core
+#   python -m esser --headless --thumbnail-sizes 1200x630 300x158
+#   python -m esser --headless --stage-log stages.jsonl --profile-stage 'build:state_esser_uses'
+#   python -m esser --list
+#   python -m esser --vendor-maps                      # download the base maps next to the figures, once
+#
+# --headless never calls fig.show(), so no renderer or browser is started on a build box.
+import argparse
+import sys
+
+
+def image_size(value):
+    width, _, height = value.partition('x')
+    try:
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected WIDTHxHEIGHT, got {value!r}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m esser', description='Regenerate the ESSER figures.')
+    parser.add_argument('--figures', nargs='+', metavar='NAME', help='only build these figures (default: all)')
+    parser.add_argument('--list', action='store_true', help='list the figure names and exit')
+    parser.add_argument('--headless', action='store_true', help='never call fig.show()')
+    parser.add_argument('--force', action='store_true', help='rebuild even if the inputs have not changed')
+    parser.add_argument('--refresh-cache', action='store_true', help='re-parse the Excel files')
+    parser.add_argument('--workers', type=int, default=1, help='render across this many processes (0: one per CPU)')
+    parser.add_argument('--thumbnail-sizes', nargs='*', type=image_size, metavar='WxH',
+                        help='PNG/WebP thumbnail sizes, the first one used for link previews (none if given no sizes)')
+    parser.add_argument('--out-dir', default='./../figures', help='where to write the figures')
+    parser.add_argument('--vendor-maps', action='store_true',
+                        help='download the plotly.js base maps into OUT_DIR/topojson and exit')
+    parser.add_argument('--stage-log', metavar='PATH', help='append per-stage timing/memory events (json lines) here')
+    parser.add_argument('--profile-stage', metavar='STAGE', help='cProfile the matching stage(s), e.g. build:state_esser_uses')
+    parser.add_argument('--trace-stage', metavar='STAGE', help='record the top allocation sites of the matching stage(s)')
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.filterwarnings("ignore", category=FutureWarning)
+
+    from . import instrument
+    instrument.configure(log=args.stage_log, profile=args.profile_stage, trace=args.trace_stage)
+
+    from . import figures  # noqa: F401  registers the figure builders
+    from .build import FIGURES, build_figures
+
+    if args.list:
+        print('\n'.join(FIGURES))
+        return 0
+
+    if args.vendor_maps:
+        from .geometry import vendor_topojson
+        try:
+            print('\n'.join(vendor_topojson(args.out_dir)))
+        except OSError as error:
+            print(f'Could not download the base maps: {error}', file=sys.stderr)
+            return 1
+        return 0
+
+    unknown = sorted(set(args.figures or []) - set(FIGURES))
+    if unknown:
+        parser.error(f"unknown figure(s): {', '.join(unknown)} (see --list)")
+
+    from .core import compute_state_metrics
+    from .ingest import read_state_inputs
+
+    df_esser, df_enrollment = read_state_inputs(refresh=args.refresh_cache)
+    df = compute_state_metrics(df_esser, df_enrollment)
+    build_figures(df, args.out_dir, names=args.figures, force=args.force, show=not args.headless,
+                  workers=args.workers, thumbnail_sizes=args.thumbnail_sizes)
+    return 0
@@ -0,0 +1,167 @@
+#%%
+# interactive server for the state-level figures (needs dash)
+#
+#   cd esser-expenditures/code
+#   python -m esser.server                      # http://127.0.0.1:8050
+#   python -m esser.server --host 0.0.0.0 --port 8000 --cache-size 4096
+#   gunicorn -w 4 'esser.server:wsgi()'         # one data load per worker process
+#
+# any registered figure can be filtered by state, narrowed to one ESSER round and, for the
+# dropdown maps, opened on one question. the merged ESSER/enrollment frame is read once per
+# process and the metrics for each round are computed once; each combination of filters is
+# built once and its figure json kept in a bounded LRU cache, so repeat requests don't touch
+# pandas or plotly.
+import argparse
+import functools
+import json
+import sys
+
+from . import figures  # noqa: F401  registers the figure builders
+from .build import FIGURES, make_figure
+from .ingest import RAW_DIR, merge_state_data, read_state_inputs
+from .metrics import ALLOCATED_COLUMNS, ESSER_METRICS, ESSER_ROUNDS, FIGURE_METRICS, REMAINING_COLUMNS, DerivedMetrics
+
+# filter combinations whose figures are kept
+CACHE_SIZE = 1024
+
+ALL_ROUNDS = 'all'
+ROUND_LABELS = {ALL_ROUNDS: 'All rounds', '1': 'ESSER I', '2': 'ESSER II', '3': 'ESSER III'}
+
+# set by create_app; read on the first request
+_inputs = {'refresh': False, 'raw_dir': RAW_DIR}
+
+
+@functools.lru_cache(maxsize=1)
+def state_data():
+    # the merged frame, one row per state, before any metrics
+    return merge_state_data(*read_state_inputs(**_inputs))
+
+
+@functools.lru_cache(maxsize=len(ROUND_LABELS))
+def round_metrics(esser_round=ALL_ROUNDS):
+    # the metrics frame, counting only one round's money unless esser_round is 'all'. the
+    # other rounds' amounts are zeroed through DerivedMetrics, so every total, ratio and rank
+    # downstream of them is recomputed for the round
+    metrics = DerivedMetrics(state_data().copy())
+    if esser_round != ALL_ROUNDS:
+        for n, allocated, remaining in zip(ESSER_ROUNDS, ALLOCATED_COLUMNS, REMAINING_COLUMNS):
+            if str(n) != esser_round:
+                metrics[allocated] = 0.0
+                metrics[remaining] = 0.0
+    return metrics.add_columns(ESSER_METRICS + FIGURE_METRICS)
+
+
+def select_option(fig, label):
+    # show the dropdown option labelled label, as if it had been picked in the browser
+    for menu in fig.layout.updatemenus:
+        for i, button in enumerate(menu.buttons):
+            if button.label == label and button.method == 'restyle':
+                fig.plotly_restyle(*button.args[:2])
+                menu.active = i
+                return fig
+    return fig
+
+
+def questions(name):
+    # the labels of a figure's restyle dropdown (the dropdown maps' questions), if it has one
+    return [
+        button.label
+        for menu in filtered_figure(name).layout.updatemenus
+        for button in menu.buttons
+        if button.method == 'restyle'
+    ]
+
+
+def _build_figure_json(name, states, esser_round, question):
+    df = round_metrics(esser_round)
+    if states:
+        # ranks (and the '/n' in the per-student map's hover text) are among the states shown
+        df = DerivedMetrics(df[df['stateCode'].isin(states)].copy()).add_columns(['rank'])
+    fig = make_figure(name, df)
+    if question:
+        select_option(fig, question)
+    return fig.to_json()
+
+
+_figure_json = functools.lru_cache(maxsize=CACHE_SIZE)(_build_figure_json)
+
+
+def figure_json(name, states=None, esser_round=ALL_ROUNDS, question=None):
+    # the figure for one combination of filters, as json; built once, then served from the cache
+    return _figure_json(name, tuple(sorted(states or ())), str(esser_round), question or None)
+
+
+def filtered_figure(name, states=None, esser_round=ALL_ROUNDS, question=None):
+    import plotly.io as pio
+
+    return pio.from_json(figure_json(name, states, esser_round, question))
+
+
+def create_app(refresh=False, raw_dir=RAW_DIR, cache_size=CACHE_SIZE):
+    global _figure_json
+    try:
+        from dash import Dash, Input, Output, dcc, html
+    except ImportError:
+        raise SystemExit('the server needs dash: pip install dash')
+
+    # a new app starts from a fresh load and an empty figure cache of its own size
+    _inputs.update(refresh=refresh, raw_dir=raw_dir)
+    state_data.cache_clear()
+    round_metrics.cache_clear()
+    _figure_json = functools.lru_cache(maxsize=cache_size)(_build_figure_json)
+
+    names = list(FIGURES)
+    app = Dash(__name__, title='Where did the ESSER money go?')
+    app.layout = html.Div([
+        html.Div([
+            dcc.Dropdown(id='figure', options=names, value=names[0], clearable=False),
+            dcc.Dropdown(id='states', multi=True, placeholder='All states'),
+            dcc.RadioItems(id='round', options=[{'label': label, 'value': value} for value, label in ROUND_LABELS.items()],
+                           value=ALL_ROUNDS, inline=True),
+            dcc.Dropdown(id='question', placeholder='Question'),
+        ], style={'display': 'grid', 'gap': '8px', 'padding': '16px', 'fontFamily': 'Poppins, sans-serif'}),
+        dcc.Graph(id='graph', config={'responsive': True}, style={'height': '80vh'}),
+    ])
+
+    @app.callback(Output('states', 'options'), Input('figure', 'value'))
+    def state_options(_):
+        return sorted(state_data()['stateCode'].astype(str))
+
+    @app.callback(Output('question', 'options'), Output('question', 'value'), Input('figure', 'value'))
+    def question_options(name):
+        options = questions(name)
+        return options, options[0] if options else None
+
+    @app.callback(Output('graph', 'figure'),
+                  Input('figure', 'value'), Input('states', 'value'), Input('round', 'value'), Input('question', 'value'))
+    def update_graph(name, states, esser_round, question):
+        # parsed from the cached json: plain lists and dicts, nothing for pandas to do
+        return json.loads(figure_json(name, states, esser_round, question))
+
+    return app
+
+
+def wsgi():
+    # for gunicorn and other wsgi servers
+    return create_app().server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m esser.server', description='Serve the ESSER figures interactively.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--refresh-cache', action='store_true', help='re-parse the Excel files')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='filter combinations to keep built')
+    parser.add_argument('--debug', action='store_true')
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.filterwarnings("ignore", category=FutureWarning)
+
+    app = create_app(refresh=args.refresh_cache, cache_size=args.cache_size)
+    app.run(host=args.host, port=args.port, debug=args.debug)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#%%
+# distributions of the ESSER metrics, in one vectorized pass
+#
+# describe() takes the metrics frame and works on every requested column at once as an
+# (n rows x k metrics) array: summary stats, a Shapiro-Wilk test, percentile ranks, histogram
+# bins and a fitted normal curve scaled to them, and (when asked for, with samples > 0)
+# bootstrap confidence intervals for the mean. the histogram figures read their bins, curve and
+# test from it and skip the bootstrap, which is most of the cost on LEA-scale frames.
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# the numeric metrics (see metrics.py) described by default
+STAT_COLUMNS = [
+    'esserAllocated', 'expenditure_per_student',
+    'esser1expendpercent', 'esser2expendpercent', 'esser3expendpercent', 'totalesserspent',
+    'data_source_score',
+]
+
+# histogram bins per metric, and points on each fitted curve
+NBINS = 30
+CURVE_POINTS = 100
+
+# resamples for describe(..., samples=BOOTSTRAP_SAMPLES); describe() doesn't bootstrap by default
+BOOTSTRAP_SAMPLES = 2000
+CONFIDENCE = 0.95
+# bin widths are stretched by this factor so the max falls inside the last bin rather than on
+# its right edge: every bin is then [edge i, edge i+1), which is how plotly bins xbins too
+BIN_STRETCH = 1 + 1e-12
+# resampled rows held in memory at once; the bootstrap runs in batches of samples under this
+BOOTSTRAP_BATCH = 10_000_000
+
+# summary: one row per metric (count, mean, std, min, q25, median, q75, max, shapiro_stat,
+#          shapiro_p, mean_low, mean_high, bin_size); mean_low/mean_high are NaN
+#          unless describe() was asked to bootstrap
+# edges / counts: histogram bin edges (NBINS + 1 per metric) and counts (NBINS per metric)
+# curve_x / curve_y: the fitted normal density, scaled to counts per bin
+# percentiles: each row's percentile rank (0-1] within each metric, aligned with the frame
+Distributions = namedtuple('Distributions', ['summary', 'edges', 'counts', 'curve_x', 'curve_y', 'percentiles'])
+
+
+def bootstrap_means(values, samples=BOOTSTRAP_SAMPLES, confidence=CONFIDENCE, seed=0):
+    # (low, high) confidence interval of each column's mean. each resample is drawn as counts
+    # of how often every row was picked, so a batch of resampled means is one matrix product
+    # over all the columns rather than a python loop or an (samples x n x k) gather
+    n, k = values.shape
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+    rng = np.random.default_rng(seed)
+    batch = max(1, BOOTSTRAP_BATCH // max(1, n))
+    means = np.empty((samples, k))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for start in range(0, samples, batch):
+            size = min(samples, start + batch) - start
+            picks = rng.integers(0, n, size=(size, n)) + (np.arange(size) * n)[:, None]
+            weights = np.bincount(picks.ravel(), minlength=size * n).reshape(size, n).astype('float64')
+            means[start:start + size] = (weights @ filled) / (weights @ present)
+    alpha = (1 - confidence) / 2
+    low, high = np.nanquantile(means, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def describe(df, columns=None, bins=NBINS, curve_points=CURVE_POINTS, samples=0,
+             confidence=CONFIDENCE, seed=0):
+    from scipy.stats import norm, shapiro
+
+    columns = list(STAT_COLUMNS if columns is None else columns)
+    values = df[columns].astype('float64').to_numpy(na_value=np.nan)
+    present = ~np.isnan(values)
+
+    count = present.sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0)
+        low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        q25, median, q75 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+    stat, p_value = shapiro(values, axis=0, nan_policy='omit')
+
+    # equal-width bins from each metric's min to (just past) its max; bin i holds [edge i, edge i+1)
+    size = (high - low) / bins * BIN_STRETCH
+    edges = low[:, None] + size[:, None] * np.arange(bins + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.floor((values - low) / np.where(size > 0, size, 1))
+    index = np.clip(np.nan_to_num(index, nan=-1), -1, bins - 1).astype(int)
+    flat = (index + np.arange(len(columns)) * bins)[present & (index >= 0)]
+    counts = np.bincount(flat, minlength=len(columns) * bins).reshape(len(columns), bins)
+
+    # normal density at each metric's mean/std, times rows per bin width, over the bins' range
+    curve_x = low[:, None] + (high - low)[:, None] * np.linspace(0, 1, curve_points)
+    curve_y = norm.pdf(curve_x, mean[:, None], std[:, None]) * (count * size)[:, None]
+
+    if samples > 0:
+        mean_low, mean_high = bootstrap_means(values, samples, confidence, seed)
+    else:
+        mean_low = mean_high = np.full(len(columns), np.nan)
+
+    summary = pd.DataFrame({
+        'count': count, 'mean': mean, 'std': std, 'min': low, 'q25': q25, 'median': median, 'q75': q75,
+        'max': high, 'shapiro_stat': stat, 'shapiro_p': p_value, 'mean_low': mean_low, 'mean_high': mean_high,
+        'bin_size': size,
+    }, index=pd.Index(columns, name='metric'))
+    return Distributions(
+        summary=summary,
+        edges=pd.DataFrame(edges, index=summary.index),
+        counts=pd.DataFrame(counts, index=summary.index),
+        curve_x=pd.DataFrame(curve_x, index=summary.index),
+        curve_y=pd.DataFrame(curve_y, index=summary.index),
+        percentiles=df[columns].rank(pct=True),
+    )
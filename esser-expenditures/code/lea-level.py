@@ -0,0 +1,64 @@
+#%%
+# where did the ESSER money go, district by district?
+import plotly.express as px
+
+from esser import build_figures
+from esser.build import TEMPLATE
+from esser.geometry import COUNTY_GEOJSON_URL, write_county_geometry
+from esser.ingest import read_excel_cached
+from esser.lea import COUNTY_COLUMN, STATE_COLUMN, STATE_FIGURES, lea_metrics, read_lea_amounts
+from esser.output import write_figure
+
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# set to True to re-parse the directory workbook instead of reading the cached Arrow copy
+refresh_cache = False
+
+# subrecipient (LEA) sheet from https://covid-relief-data.ed.gov/data-download, streamed in chunks
+df_lea_amounts = read_lea_amounts('./../data/raw/esser-subrecipient-data.xlsx', sheet_name='subrecipient')
+# NCES common core of data LEA directory: leaNcesId, leaName, countyFips, enrollment
+df_directory = read_excel_cached('./../data/raw/lea-directory.xlsx', refresh=refresh_cache)
+
+df_lea, df_county, df_state = lea_metrics(df_lea_amounts, df_directory)
+
+# county boundaries are referenced by URL so the geometry isn't embedded in every page. the
+# county map uses the 0.01 degree copy written next to the figures (full detail if that fails).
+# there's no district-level map: nothing here writes school district boundaries
+county_geojson = write_county_geometry('./../figures').get(0.01, COUNTY_GEOJSON_URL)
+
+# %%
+# what percent is spent, by county
+fig = px.choropleth(
+    df_county,
+    geojson=county_geojson,
+    locations=COUNTY_COLUMN,
+    color='totalesserspent',
+    color_continuous_scale="Viridis",
+    range_color=(0, 1),
+    scope="usa",
+    template=TEMPLATE,
+    hover_data={STATE_COLUMN: True, 'totalesserspent': ':.1%', 'expenditure_per_student': ':$,.2f'},
+    labels={'totalesserspent': 'Percent Spent', 'expenditure_per_student': 'Expenditure per Student'},
+)
+fig.update_traces(marker_line_width=0)
+fig.update_layout(
+    title={
+        'text': 'What percent of ESSER funds are spent in each county?',
+        'y': 0.95,
+        'x': 0.5,
+        'xanchor': 'center',
+        'yanchor': 'top',
+        'font': dict(size=40, family="Castoro", color="black")
+    },
+    coloraxis_colorbar=dict(title="Percentage Spent", tickformat=".0%"),
+)
+write_figure(fig, './../figures/county-esser-percent-spent.html')
+
+# %%
+# the state rollup of the same pass, drawn with the state-level figures that only need amounts
+# and enrollment (see esser/figures.py), next to the state pages for comparison. the pages load
+# the plotly.js the state pages already share rather than writing a second copy
+built = build_figures(df_state, './../figures/lea-rollup', names=STATE_FIGURES, bundle_dir='./../figures')
+
+# %%
@@ -0,0 +1,5 @@
+# run from esser-expenditures/code: python -m pytest tests
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -0,0 +1,126 @@
+import os
+
+import pandas as pd
+import pytest
+
+from esser import figures, metrics, output, stats
+from esser.build import FIGURES, MANIFEST, fingerprint
+
+
+def state_frame():
+    return pd.DataFrame({
+        'stateCode': ['AL', 'AK', 'AZ'],
+        'esserAllocated': [1.0e9, 2.0e8, 3.5e9],
+    })
+
+
+def test_fingerprint_is_stable():
+    spec = FIGURES['state-esser-allocations']
+    assert fingerprint(spec, state_frame()) == fingerprint(spec, state_frame())
+
+
+def test_fingerprint_changes_with_input_data():
+    spec = FIGURES['state-esser-allocations']
+    df = state_frame()
+    before = fingerprint(spec, df)
+    df.loc[0, 'esserAllocated'] += 1
+    assert fingerprint(spec, df) != before
+
+
+@pytest.mark.parametrize('module, name, value', [
+    (figures, 'yes_no_colorscale', [[0, 'black'], [1, 'white']]),
+    (figures, 'columns_with_names', {'esser_use_x': 'Something else'}),
+    (stats, 'NBINS', 10),
+    (metrics, 'data_source_mapping', {'isEsserAIdentifiedByHealthData': 'Health'}),
+    (output, 'PAGE_TEMPLATE', '<html>{spec}</html>'),
+])
+def test_shared_module_constant_marks_figure_stale(monkeypatch, module, name, value):
+    # the builder doesn't read any of these directly; they still change what it draws
+    spec = FIGURES['state-esser-allocations']
+    before = fingerprint(spec, state_frame())
+    monkeypatch.setattr(module, name, value)
+    assert fingerprint(spec, state_frame()) != before
+
+
+def test_missing_thumbnails_are_written_for_up_to_date_figures(tmp_path, monkeypatch):
+    from esser import build_figures
+
+    written = []
+
+    def write_thumbnails(figs, out_dir, sizes):
+        paths = [path for name in figs for path, *_ in output.thumbnail_paths(out_dir, name, sizes)]
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'wb').close()
+        written.append(sorted(figs))
+        return paths
+
+    monkeypatch.setattr(output, 'thumbnails_available', lambda: True)
+    monkeypatch.setattr(output, 'write_thumbnails', write_thumbnails)
+    out_dir = str(tmp_path)
+    names = ['state-esser-allocations']
+
+    assert build_figures(state_frame(), out_dir, names=names, thumbnail_sizes=[(120, 63)]) == names
+    # up to date, thumbnails there
+    assert build_figures(state_frame(), out_dir, names=names, thumbnail_sizes=[(120, 63)]) == []
+    # a new size, then a deleted image
+    assert build_figures(state_frame(), out_dir, names=names, thumbnail_sizes=[(120, 63), (60, 32)]) == []
+    os.remove(os.path.join(out_dir, 'img', 'state-esser-allocations.png'))
+    assert build_figures(state_frame(), out_dir, names=names, thumbnail_sizes=[(120, 63), (60, 32)]) == []
+    assert written == [names, names, names]
+
+
+def test_nested_build_loads_the_shared_plotlyjs(tmp_path):
+    from esser import build_figures
+
+    out_dir = str(tmp_path)
+    bundle = output.plotlyjs_bundle(out_dir)
+    nested = os.path.join(out_dir, 'lea-rollup')
+    build_figures(state_frame(), nested, names=['state-esser-allocations'], thumbnail_sizes=[], bundle_dir=out_dir)
+    assert not [name for name in os.listdir(nested) if name.startswith('plotly-')]
+    for page in ['state-esser-allocations.html', 'dashboard.html']:
+        with open(os.path.join(nested, page), encoding='utf-8') as file:
+            assert f'src="../{bundle}"' in file.read()
+
+
+def test_forced_rebuild_writes_identical_bytes(tmp_path):
+    from esser import build_figures
+
+    def snapshot():
+        files = {}
+        for root, _, names in os.walk(tmp_path):
+            for name in names:
+                path = os.path.join(root, name)
+                with open(path, 'rb') as file:
+                    files[os.path.relpath(path, tmp_path)] = (file.read(), os.stat(path).st_mtime_ns)
+        return files
+
+    names = ['state-esser-allocations', 'state-esser-allocations-histogram']
+    build_figures(state_frame(), str(tmp_path), names=names, thumbnail_sizes=[])
+    before = snapshot()
+    assert build_figures(state_frame(), str(tmp_path), names=names, force=True, thumbnail_sizes=[]) == names
+    after = snapshot()
+    # the manifest is rewritten every build; the pages, specs and dashboard are left untouched
+    assert after.pop(MANIFEST)[0] == before.pop(MANIFEST)[0]
+    assert after == before
+
+
+def test_make_figure_leaves_the_global_template_alone(monkeypatch):
+    import plotly.io as pio
+
+    from esser.build import make_figure
+
+    monkeypatch.setattr(pio.templates, 'default', 'plotly_dark')
+    for name in ['state-esser-allocations', 'state-esser-allocations-histogram']:
+        fig = make_figure(name, state_frame())
+        assert fig.layout.template == pio.templates['plotly_white']
+    assert pio.templates.default == 'plotly_dark'
+
+
+def test_rank_is_out_of_the_states_drawn():
+    from esser.build import make_figure
+
+    df = pd.DataFrame({'stateCode': ['AL', 'AK', 'AZ'], 'expenditure_per_student_numeric': [3.0, 1.0, 2.0],
+                       'rank': [1, 3, 2]})
+    fig = make_figure('state-esser-allocations-per-student', df)
+    assert fig.data[0].hovertemplate.endswith('Rank: %{customdata}/3')
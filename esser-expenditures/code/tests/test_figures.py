@@ -0,0 +1,30 @@
+import warnings
+
+import pytest
+
+from esser.bench import synthetic_state_data
+from esser.build import make_figure
+from esser.metrics import add_esser_metrics, add_figure_columns
+
+
+@pytest.fixture(scope='module')
+def state_metrics():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        return add_figure_columns(add_esser_metrics(synthetic_state_data(51)))
+
+
+@pytest.mark.parametrize('name', ['state_esser_uses', 'state_percent_esser_spent'])
+def test_dropdown_maps_restyle_one_trace(state_metrics, name):
+    fig = make_figure(name, state_metrics)
+    assert len(fig.data) == 1
+    trace = fig.data[0]
+    buttons = fig.layout.updatemenus[0].buttons
+    assert len(buttons) > 1
+    for button in buttons:
+        assert button.method == 'restyle'
+        update, traces = button.args
+        assert list(traces) == [0]
+        assert all(len(values[0]) == len(trace.locations) for values in update.values())
+    # the trace starts out showing the first option
+    assert list(buttons[0].args[0]['z'][0]) == list(trace.z)
@@ -0,0 +1,25 @@
+import json
+import os
+
+import pandas as pd
+
+from esser import instrument
+from esser.ingest import read_excel_cached
+
+
+def test_mixed_type_columns_are_cached_as_strings(tmp_path, monkeypatch):
+    log = tmp_path / 'stages.jsonl'
+    monkeypatch.setenv(instrument.LOG_VARIABLE, str(log))
+    path = str(tmp_path / 'sheet.xlsx')
+    pd.DataFrame({'code': [1, 'A2', None], 'amount': [1.5, 2.5, 3.5]}).to_excel(path, index=False)
+    cache_dir = str(tmp_path / 'cache')
+
+    parsed = read_excel_cached(path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    cached = read_excel_cached(path, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(parsed, cached)
+    assert cached['code'].tolist()[:2] == ['1', 'A2'] and pd.isna(cached['code'][2])
+    assert cached['amount'].tolist() == [1.5, 2.5, 3.5]
+
+    (event,) = [json.loads(line) for line in log.read_text().splitlines()]
+    assert event['coerced_to_string'] == ['code']
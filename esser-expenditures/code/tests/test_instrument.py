@@ -0,0 +1,67 @@
+import builtins
+import importlib
+import json
+import sys
+
+from esser import instrument
+
+
+def test_configure_keeps_settings_from_the_environment(monkeypatch, tmp_path):
+    log = str(tmp_path / 'stages.jsonl')
+    monkeypatch.setenv(instrument.LOG_VARIABLE, log)
+    instrument.configure()
+    assert instrument.os.environ[instrument.LOG_VARIABLE] == log
+    instrument.configure(profile='build:*')
+    assert instrument.os.environ[instrument.LOG_VARIABLE] == log
+    monkeypatch.delenv(instrument.PROFILE_VARIABLE)
+
+
+def test_stage_logs_an_event(monkeypatch, tmp_path):
+    log = tmp_path / 'stages.jsonl'
+    monkeypatch.setenv(instrument.LOG_VARIABLE, str(log))
+    with instrument.stage('load', rows=3) as event:
+        event['bytes'] = 10
+    (line,) = log.read_text().splitlines()
+    event = json.loads(line)
+    assert event['stage'] == 'load' and event['rows'] == 3 and event['bytes'] == 10
+    assert event['seconds'] >= 0
+
+
+def test_imports_without_the_resource_module(monkeypatch, tmp_path):
+    # as on windows
+    real_import = builtins.__import__
+
+    def no_resource(name, *args, **kwargs):
+        if name == 'resource':
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.delitem(sys.modules, 'resource', raising=False)
+    monkeypatch.setattr(builtins, '__import__', no_resource)
+    try:
+        module = importlib.reload(instrument)
+        assert module.peak_rss_mb() is None
+        log = tmp_path / 'stages.jsonl'
+        monkeypatch.setenv(module.LOG_VARIABLE, str(log))
+        with module.stage('load'):
+            pass
+        assert 'peak_rss_mb' not in json.loads(log.read_text())
+    finally:
+        monkeypatch.setattr(builtins, '__import__', real_import)
+        importlib.reload(instrument)
+
+
+def test_compute_state_metrics_logs_merge_and_impute(monkeypatch, tmp_path):
+    from esser.bench import synthetic_state_data
+    from esser.core import compute_state_metrics
+    from esser.ingest import esser_schema
+
+    log = tmp_path / 'stages.jsonl'
+    monkeypatch.setenv(instrument.LOG_VARIABLE, str(log))
+    df = synthetic_state_data(51)
+    df_esser = df[list(esser_schema)]
+    df_enrollment = df[['state', 'Fall 2019']].astype({'state': object})
+    assert len(compute_state_metrics(df_esser, df_enrollment)) == 51
+    events = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [event['stage'] for event in events] == ['merge', 'impute']
+    assert events[0]['rows'] == 51
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from esser.lea import ENROLLED_SHARE_COLUMN, add_lea_directory, aggregate_leas, lea_metrics
+from esser.metrics import AMOUNT_COLUMNS
+
+
+def chunk(ids, amount=100.0):
+    return pd.DataFrame({'stateCode': ['AL'] * len(ids), 'leaNcesId': ids,
+                         **{column: [amount] * len(ids) for column in AMOUNT_COLUMNS}})
+
+
+def directory():
+    return pd.DataFrame({
+        'leaNcesId': [100001, 100002, 100003],
+        'leaName': ['North', 'South', 'Unreported'],
+        'countyFips': [1001, 1001, 1001],
+        'enrollment': [10, 10, np.nan],
+    })
+
+
+def test_ids_are_normalized_before_aggregating():
+    df_lea = aggregate_leas([chunk([100001, 100002]), chunk(['0100001', '100003'])])
+    assert df_lea['leaNcesId'].tolist() == ['0100001', '0100002', '0100003']
+    assert df_lea['esser1GrantAmountAllocated'].tolist() == [200.0, 100.0, 100.0]
+
+
+def test_rollup_per_student_only_counts_enrolled_leas():
+    df_lea_amounts = aggregate_leas([chunk([100001, 100002, 100003])])
+    df_lea, df_county, df_state = lea_metrics(df_lea_amounts, directory())
+    assert df_lea['expenditure_per_student'].tolist()[:2] == [30.0, 30.0]
+    for df in (df_county, df_state):
+        assert df['expenditure_per_student'].tolist() == [30.0]
+        assert df['esserAllocated'].tolist() == [900.0]
+        assert df[ENROLLED_SHARE_COLUMN].tolist() == pytest.approx([2 / 3])
+
+
+def test_add_lea_directory_leaves_its_input_alone():
+    df_lea = aggregate_leas([chunk([100001, 100002])])
+    df_lea['leaNcesId'] = df_lea['leaNcesId'].str.lstrip('0')
+    before = df_lea.copy()
+    add_lea_directory(df_lea, directory())
+    pd.testing.assert_frame_equal(df_lea, before)
+
+
+def test_missing_directory_columns_fail_loudly():
+    with pytest.raises(ValueError, match='leaName'):
+        add_lea_directory(aggregate_leas([chunk([100001])]), directory().drop(columns='leaName'))
+
+
+def test_state_rollup_draws_the_state_figures():
+    from esser.build import make_figure
+    from esser.lea import STATE_FIGURES
+
+    df_lea_amounts = aggregate_leas([chunk([100001, 100002, 100003])])
+    _, _, df_state = lea_metrics(df_lea_amounts, directory())
+    for name in STATE_FIGURES:
+        assert make_figure(name, df_state).data
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from esser.metrics import DerivedMetrics, dependents
+
+
+def state_frame():
+    return pd.DataFrame({
+        'stateCode': ['AL', 'AK'],
+        'esser1GrantAmountAllocated': [100.0, 10.0],
+        'esser2GrantAmountAllocated': [200.0, 20.0],
+        'esser3GrantAmountAllocated': [300.0, 30.0],
+        'esser1GrantAmountRemaining': [0.0, 5.0],
+        'esser2GrantAmountRemaining': [100.0, 10.0],
+        'esser3GrantAmountRemaining': [300.0, 30.0],
+        'Fall 2019': [10, 3],
+    })
+
+
+def test_metrics_are_computed_from_their_inputs():
+    metrics = DerivedMetrics(state_frame())
+    assert metrics['esserAllocated'].tolist() == [600.0, 60.0]
+    assert metrics['expenditure_per_student'].tolist() == [60.0, 20.0]
+    assert metrics['rank'].tolist() == [1, 2]
+
+
+def test_setting_an_input_recomputes_its_dependents():
+    metrics = DerivedMetrics(state_frame())
+    assert metrics['totalesserspent'].tolist() == pytest.approx([1 - 400 / 600, 1 - 45 / 60])
+    metrics['esser3GrantAmountRemaining'] = 0.0
+    assert metrics['esserAllocated'].tolist() == [600.0, 60.0]
+    assert metrics['totalesserspent'].tolist() == pytest.approx([1 - 100 / 600, 1 - 15 / 60])
+
+
+def test_setting_the_enrollment_alias():
+    metrics = DerivedMetrics(state_frame())
+    metrics['expenditure_per_student']
+    metrics['Fall 2019'] = [20, 3]
+    assert metrics['expenditure_per_student'].tolist() == [30.0, 20.0]
+
+
+def test_overriding_a_derived_input():
+    metrics = DerivedMetrics(state_frame())
+    assert metrics['expenditure_per_student'].tolist() == [60.0, 20.0]
+    metrics['esserAllocated'] = 0.0
+    assert metrics['esserAllocated'].tolist() == [0.0, 0.0]
+    assert metrics['expenditure_per_student'].tolist() == [0.0, 0.0]
+    assert metrics['expenditure_per_student_numeric'].tolist() == [0.0, 0.0]
+    # the other metrics over the same rounds are still computed
+    assert metrics['totalAmountAllocated'].tolist() == [600.0, 60.0]
+
+
+def test_invalidate_drops_the_column_itself():
+    metrics = DerivedMetrics(state_frame())
+    assert metrics['esserAllocated'].tolist() == [600.0, 60.0]
+    metrics.df['esser1GrantAmountAllocated'] = 0.0
+    metrics.invalidate('esserAllocated')
+    assert metrics['esserAllocated'].tolist() == [500.0, 50.0]
+    assert metrics['expenditure_per_student'].tolist() == [50.0, 50 / 3]
+
+
+def test_dependents_are_transitive():
+    assert {'esserAllocated', 'expenditure_per_student', 'expenditure_per_student_numeric', 'rank'} <= \
+        dependents('esser1GrantAmountAllocated')
+
+
+def test_per_student_rounding_matches_round():
+    # Series.round(2) in place of round(x, 2) per row: same cents on amounts over enrollments
+    from esser.bench import synthetic_state_data
+
+    metrics = DerivedMetrics(synthetic_state_data(20_000))
+    expected = metrics['expenditure_per_student'].map(lambda x: round(x, 2))
+    pd.testing.assert_series_equal(metrics['expenditure_per_student_numeric'], expected, check_names=False)
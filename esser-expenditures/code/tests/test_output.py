@@ -0,0 +1,77 @@
+import json
+
+import plotly.graph_objects as go
+import pytest
+
+from esser import output
+
+
+def test_figure_json_is_safe_inside_a_script():
+    name = 'Springfield </script><script>alert(1)</script> <!-- & co'
+    fig = go.Figure(go.Bar(x=[name, name, 'other'], y=[1, 2, 3], hovertext=[name, name, name]))
+    fig.update_layout(title=name)
+    spec = output.figure_json(fig)
+    assert '<' not in spec and '>' not in spec and '&' not in spec
+    decoded = output.decode_categoricals(json.loads(spec))
+    assert decoded['layout']['title']['text'] == name
+    assert decoded['data'][0]['hovertext'] == [name, name, name]
+
+
+def test_page_has_no_raw_markup_from_the_figure(tmp_path):
+    fig = go.Figure(go.Bar(x=['</script>'], y=[1]))
+    page = output.write_figure(fig, str(tmp_path / 'figure.html'), mode='cdn', config={'displaylogo': False})
+    with open(page, encoding='utf-8') as file:
+        assert '</script>' not in file.read().split('var spec = ')[1].split(';\n')[0]
+
+
+
+@pytest.mark.parametrize('mode', ['cdn', 'inline'])
+def test_dashboard_follows_the_plotlyjs_mode(tmp_path, mode):
+    page = output.write_dashboard({}, str(tmp_path / 'dashboard.html'), mode=mode)
+    with open(page, encoding='utf-8') as file:
+        assert output.plotlyjs_tag(page, mode) in file.read()
+    assert not list(tmp_path.glob('plotly-*.js'))
+
+def test_figure_config_only_reads_the_vendored_maps(tmp_path, monkeypatch):
+    import urllib.request
+
+    from esser import geometry
+
+    def offline(*args, **kwargs):
+        raise AssertionError('the build went online')
+
+    monkeypatch.setattr(urllib.request, 'urlopen', offline)
+    assert output.figure_config(str(tmp_path)) == {}
+    assert not (tmp_path / geometry.TOPOJSON_DIR).exists()
+
+    (tmp_path / geometry.TOPOJSON_DIR).mkdir()
+    for name in geometry.TOPOJSON_NAMES:
+        (tmp_path / geometry.TOPOJSON_DIR / f'{name}.json').write_text('{}')
+    assert output.figure_config(str(tmp_path)) == {'topojsonURL': 'topojson/'}
+
+
+def test_dropdown_choropleth_round_trips():
+    from esser.figures import dropdown_choropleth
+
+    states = ['AL', 'AK', 'AZ', 'AR']
+    options = [
+        (label, {
+            'z': [1.0, 2.0, 3.0, 4.0],
+            'text': [label, label, label, None],
+            'customdata': [[label, 'Yes'], [label, 'No'], [label, 'Yes'], [label, None]],
+        })
+        for label in ['Health', 'Learning loss']
+    ]
+    fig, buttons = dropdown_choropleth(states, options, locationmode='USA-states')
+    fig.update_layout(updatemenus=[dict(buttons=buttons)])
+    original = json.loads(fig.to_json())
+
+    encoded = json.loads(output.figure_json(fig))
+    assert 'codes' in encoded['data'][0]['text']
+    assert 'codes' in encoded['layout']['updatemenus'][0]['buttons'][1]['args'][0]['text'][0]
+
+    decoded = output.decode_categoricals(encoded)
+    assert decoded['data'][0]['text'] == original['data'][0]['text']
+    assert decoded['data'][0]['customdata'] == original['data'][0]['customdata']
+    assert [button['args'] for button in decoded['layout']['updatemenus'][0]['buttons']] == \
+        [button['args'] for button in original['layout']['updatemenus'][0]['buttons']]
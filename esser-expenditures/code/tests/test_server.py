@@ -0,0 +1,47 @@
+import functools
+import json
+
+import pytest
+
+from esser import server
+from esser.bench import synthetic_state_data
+
+
+@pytest.fixture
+def app_data(monkeypatch):
+    # the synthetic merged frame in place of the Excel files, and empty caches around each test
+    df = synthetic_state_data(51)
+    monkeypatch.setattr(server, 'state_data', lambda: df)
+    server.round_metrics.cache_clear()
+    monkeypatch.setattr(server, '_figure_json', functools.lru_cache(maxsize=16)(server._build_figure_json))
+    yield df
+    server.round_metrics.cache_clear()
+
+
+def test_each_filter_combination_is_built_once(app_data):
+    name = 'state-esser-allocations'
+    first = server.figure_json(name, ['CA', 'AL'], '2')
+    # the same filters in another order, and the round as an int, are the same cache entry
+    assert server.figure_json(name, ['AL', 'CA'], 2) is first
+    info = server._figure_json.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+    server.figure_json(name, ['AL', 'CA'], '3')
+    server.figure_json(name, None, '2')
+    server.figure_json('state-esser-allocations-histogram', ['AL', 'CA'], '2')
+    assert server._figure_json.cache_info().misses == 4
+    # one metrics frame per round
+    assert server.round_metrics.cache_info().misses == 2
+
+
+def test_filtered_rank_is_among_the_selected_states(app_data):
+    spec = json.loads(server.figure_json('state-esser-allocations-per-student', ['AL', 'CA', 'NY']))
+    trace = spec['data'][0]
+    assert trace['hovertemplate'].endswith('/3')
+    assert sorted(trace['customdata']) == [1, 2, 3]
+
+
+def test_a_round_counts_only_its_own_money(app_data):
+    df = server.round_metrics('1')
+    assert (df['esserAllocated'] == app_data['esser1GrantAmountAllocated']).all()
+    assert (server.round_metrics('all')['esserAllocated'] > df['esserAllocated']).all()
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from esser.stats import NBINS, describe
+
+
+def frame():
+    rng = np.random.default_rng(0)
+    values = rng.normal(100, 15, 500)
+    values[:5] = np.nan
+    return pd.DataFrame({'a': values, 'b': rng.uniform(0, 1, 500)})
+
+
+def test_bins_hold_every_value_including_the_max():
+    df = frame()
+    distribution = describe(df, ['a', 'b'])
+    summary = distribution.summary
+    assert distribution.counts.sum(axis=1).tolist() == summary['count'].tolist()
+    for column in ['a', 'b']:
+        edges = distribution.edges.loc[column]
+        assert len(edges) == NBINS + 1
+        assert edges.iloc[0] == summary.at[column, 'min']
+        assert edges.iloc[-2] < summary.at[column, 'max'] < edges.iloc[-1]
+        # what plotly draws with xbins=dict(start=edges[0], size=bin_size)
+        values = df[column].dropna()
+        drawn = np.floor((values - edges.iloc[0]) / summary.at[column, 'bin_size']).astype(int)
+        assert np.bincount(drawn, minlength=NBINS).tolist() == distribution.counts.loc[column].tolist()
+
+
+def test_bootstrap_is_opt_in():
+    summary = describe(frame(), ['a']).summary
+    assert np.isnan(summary.at['a', 'mean_low']) and np.isnan(summary.at['a', 'mean_high'])
+    summary = describe(frame(), ['a'], samples=200).summary
+    assert summary.at['a', 'mean_low'] < summary.at['a', 'mean'] < summary.at['a', 'mean_high']
@@ -0,0 +1,67 @@
+#%%
+# offline zipcode geocoding for the grantee map
+#
+# grantee zipcodes are resolved against the census ZCTA gazetteer (one centroid per ZIP Code
+# Tabulation Area) instead of one uszipcode query per row. the gazetteer is parsed once into
+# an Arrow file keyed on its sha256 and memory-mapped after that, and each call dedupes the
+# zipcodes and resolves them in a single join, so there's no network or sqlite per lookup.
+#
+# gazetteer: https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2020_Gazetteer/2020_Gaz_zcta_national.zip
+import hashlib
+import os
+
+import pandas as pd
+
+GAZETTEER_PATH = './data/raw/2020_Gaz_zcta_national.txt'
+CACHE_DIR = './data/cache'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_zipcodes(zipcodes):
+    # '02903', 2903, 2903.0 and '02903-1234' all become '02903'; anything else is <NA>
+    zipcodes = pd.Series(zipcodes).astype('string').str.strip()
+    zipcodes = zipcodes.str.replace(r'\.0$', '', regex=True).str.extract(r'^(\d{3,5})(?:-\d{4})?$', expand=False)
+    return zipcodes.str.zfill(5)
+
+
+def load_centroids(gazetteer=GAZETTEER_PATH, cache_dir=CACHE_DIR, refresh=False):
+    # zipcode-indexed frame of lat/lon centroids
+    from pyarrow import feather
+
+    key = file_digest(gazetteer)[:16]
+    cached = os.path.join(cache_dir, f'zcta-centroids.{key}.arrow')
+    if not refresh and os.path.exists(cached):
+        return feather.read_table(cached, memory_map=True).to_pandas().set_index('zipcode')
+
+    df = pd.read_csv(gazetteer, sep='\t', dtype={'GEOID': str})
+    df.columns = df.columns.str.strip()  # the last header has trailing whitespace
+    df = df.rename(columns={'GEOID': 'zipcode', 'INTPTLAT': 'lat', 'INTPTLONG': 'lon'})[['zipcode', 'lat', 'lon']]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for name in os.listdir(cache_dir):
+        if name.startswith('zcta-centroids.') and name.endswith('.arrow'):
+            os.remove(os.path.join(cache_dir, name))
+    feather.write_feather(df, cached, compression='uncompressed')
+    return df.set_index('zipcode')
+
+
+def geocode(zipcodes, centroids=None):
+    # lat/lon for each zipcode, aligned with the input; unknown zipcodes get NaN
+    if centroids is None:
+        centroids = load_centroids()
+    zipcodes = normalize_zipcodes(zipcodes)
+    unique = pd.Index(zipcodes.dropna().unique())
+    resolved = centroids.reindex(unique)
+    missing = resolved['lat'].isna().sum()
+    if missing:
+        print(f'No centroid for {missing} of {len(unique)} zipcodes: {", ".join(unique[resolved["lat"].isna()][:10])}')
+    coordinates = resolved.reindex(zipcodes)
+    coordinates.index = zipcodes.index
+    return coordinates
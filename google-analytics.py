@@ -1,5 +1,12 @@
 #%%
+# add the Google Analytics tag and Open Graph meta tags to every figure page
+#
+# only the start of each file is read to find <head>; the tags and the rest of the file are
+# streamed into a temp file that replaces the original, so a page is never half-written.
+# pages that already carry the tag are left alone, so this is safe to run after every build.
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # Specify the folder containing your HTML files
 folder_path = './esser-expenditures/figures'  # Replace with your folder path
@@ -7,17 +14,21 @@ folder_path = './esser-expenditures/figures'  # Replace with your folder path
 # Specify your Google Analytics tracking ID
 tracking_id = 'G-09KK2TCTB4'  # Replace with your Google Analytics tracking ID
 
-# Iterate over all files in the specified folder
-for filename in os.listdir(folder_path):
-    if filename.endswith('.html'):
-        # Create title, description, image URL, and page URL based on the filename
-        page_title = filename.replace('.html', '')
-        page_description = f"A detailed view of {page_title}."
-        page_image_url = f"https://log.jasongodfrey.info/img/{page_title}.png"
-        page_url = f"https://log.jasongodfrey.info/html-files/{page_title}.html"
-
-        # Google Analytics script and Open Graph meta tags to be inserted
-        ga_script = f"""
+# how far into a file to look for <head>
+head_window = 64 * 1024
+
+workers = 8
+
+
+def tags(filename):
+    # Create title, description, image URL, and page URL based on the filename
+    page_title = filename.replace('.html', '')
+    page_description = f"A detailed view of {page_title}."
+    page_image_url = f"https://log.jasongodfrey.info/img/{page_title}.png"
+    page_url = f"https://log.jasongodfrey.info/html-files/{page_title}.html"
+
+    # Google Analytics script and Open Graph meta tags to be inserted
+    return f"""
             <!-- Google tag (gtag.js) -->
             <script async src="https://www.googletagmanager.com/gtag/js?id={tracking_id}"></script>
             <script>
@@ -36,20 +47,35 @@ for filename in os.listdir(folder_path):
             <meta property="og:type" content="website" />
         """
 
-        file_path = os.path.join(folder_path, filename)
 
-        # Read the HTML file with UTF-8 encoding
-        with open(file_path, 'r', encoding='utf-8') as file:
-            html_content = file.read()
+def add_tags(file_path):
+    filename = os.path.basename(file_path)
+    marker = f'gtag/js?id={tracking_id}'.encode('utf-8')
+    block = f'\n{tags(filename)}'.encode('utf-8')
+
+    with open(file_path, 'rb') as source:
+        start = source.read(head_window)
+        head = start.find(b'<head>')
+        if head < 0:
+            return f'No <head> in {filename}, skipped'
+        if marker in start:
+            return f'{filename} already has the tag'
 
-        # Insert the GA script just after the <head> tag
-        modified_html_content = html_content.replace('<head>', f'<head>\n{ga_script}')
+        tmp_path = f'{file_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as target:
+            target.write(start[:head + len(b'<head>')])
+            target.write(block)
+            target.write(start[head + len(b'<head>'):])
+            shutil.copyfileobj(source, target, 1 << 20)
+    shutil.copymode(file_path, tmp_path)
+    os.replace(tmp_path, file_path)
+    return f'Added Google Analytics tracking and Open Graph tags to {filename}'
 
-        # Save the modified HTML content back to the file with UTF-8 encoding
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(modified_html_content)
 
-        print(f'Added Google Analytics tracking and Open Graph tags to {filename}')
+pages = [os.path.join(folder_path, filename) for filename in sorted(os.listdir(folder_path)) if filename.endswith('.html')]
+with ThreadPoolExecutor(max_workers=workers) as pool:
+    for message in pool.map(add_tags, pages):
+        print(message)
 
 print('All HTML files have been processed.')
 # %%
@@ -0,0 +1,198 @@
+#%%
+# accelerate's grantees (index.html)
+#
+# one page for both looks: the light and dark themes are layout presets the page switches
+# between with Plotly.relayout (the buttons on the map, or index.html?theme=light|dark), so
+# the grantee data is only written once. plotly.js isn't inlined: the page loads the same
+# versioned, content-hashed plotly.min.js the ESSER figures use (esser/output.py), written next
+# to it. accelerate-grantees-darkbg.html is now a redirect to index.html?theme=dark for old links.
+import json
+import sys
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from PIL import Image
+
+from cluster import cluster_levels, marker_size, zoom_script
+from geocode import geocode
+
+sys.path.insert(0, './esser-expenditures/code')
+from esser.output import plotlyjs_bundle  # noqa: E402
+
+# one row per grantee: grantee, zipcode, state, category ('CEA State' or 'State Leading Recovery'),
+# cohort ('CEA 2022' or 'CEA 2023')
+df = pd.read_csv('./data/grantees.csv', dtype={'zipcode': str})
+
+# coordinates come from the offline ZCTA centroid table (see geocode.py)
+df[['lat', 'lon']] = geocode(df['zipcode'])
+
+cohort_colors = {
+    'CEA 2022': '#0F1D2F',
+    'CEA 2023': '#A3C1DA',
+}
+
+category_colors = {
+    'CEA State': '#658DC0',
+    'State Leading Recovery': '#00cc96',
+}
+
+# layout presets, as Plotly.relayout updates
+themes = {
+    'dark': {
+        'paper_bgcolor': '#0F1D2F',
+        'plot_bgcolor': '#0F1D2F',
+        'geo.bgcolor': '#0F1D2F',
+        'geo.lakecolor': '#0F1D2F',
+        'geo.subunitcolor': '#0F1D2F',
+        'geo.countrycolor': '#0F1D2F',
+    },
+    'light': {
+        'paper_bgcolor': '#FFFFFF',
+        'plot_bgcolor': '#FFFFFF',
+        'geo.bgcolor': '#FFFFFF',
+        'geo.lakecolor': '#FFFFFF',
+        'geo.subunitcolor': '#FFFFFF',
+        'geo.countrycolor': '#FFFFFF',
+    },
+}
+# the theme the page opens with when the url doesn't ask for one
+default_theme = 'dark'
+
+# set to True to also open the map in a browser (leave off for headless runs and CI)
+show = False
+
+# %%
+# states, shaded by grantee category
+fig = px.choropleth(
+    df,
+    locations='state',
+    locationmode='USA-states',
+    color=df['category'].to_numpy(),
+    color_discrete_map=category_colors,
+    hover_name=df['category'].where(df['category'] == 'State Leading Recovery', ''),
+)
+fig.update_traces(hovertemplate='%{hovertext}<extra></extra>')
+
+# legend entries for the grantee cohorts
+for cohort, color in cohort_colors.items():
+    fig.add_trace(go.Scattergeo(
+        lat=[None],
+        lon=[None],
+        mode='markers',
+        marker=dict(size=10, color=color),
+        name=cohort,
+        showlegend=True,
+    ))
+
+# grantees, clustered per zoom level (see cluster.py); only the coarsest level starts visible
+level_traces = []
+for i, clusters in enumerate(cluster_levels(df).values()):
+    level_traces.append(len(fig.data))
+    fig.add_trace(go.Scattergeo(
+        lat=clusters['lat'],
+        lon=clusters['lon'],
+        text=clusters['label'],
+        locationmode='USA-states',
+        mode='markers',
+        marker=dict(
+            size=marker_size(clusters['count']),
+            color=clusters['cohort'].map(cohort_colors),
+            opacity=0.8,
+            line=dict(width=1, color='lightskyblue'),
+        ),
+        hoverinfo='text',
+        showlegend=False,
+        visible=(i == 0),
+    ))
+
+fig.update_layout(
+    title={
+        'text': "Accelerate's Grantees",
+        'y': 0.95,
+        'x': 0.5,
+        'xanchor': 'center',
+        'yanchor': 'top',
+        'font': dict(size=40, family="Castoro", color="#0F1D2F")
+    },
+    geo=dict(
+        scope='usa',
+        projection=go.layout.geo.Projection(type='albers usa'),
+        showland=True,
+        landcolor='#A9A9A9',
+    ),
+    legend=dict(
+        x=0.9,
+        y=0.95,
+        orientation='v',
+        bgcolor='rgba(255, 255, 255, 0.7)',
+        bordercolor='rgba(0, 0, 0, 0.5)',
+        borderwidth=2,
+    ),
+    showlegend=True,
+    margin=dict(l=0, r=0, t=40, b=0),
+)
+
+# the default theme, and a button per theme that applies its preset
+fig.update_layout(**{key.replace('.', '_'): value for key, value in themes[default_theme].items()})
+fig.update_layout(updatemenus=[dict(
+    type='buttons',
+    direction='left',
+    active=list(themes).index(default_theme),
+    buttons=[dict(label=name.title(), method='relayout', args=[preset]) for name, preset in themes.items()],
+    showactive=True,
+    x=0.01,
+    xanchor='left',
+    y=0.99,
+    yanchor='top',
+    bgcolor='rgba(255, 255, 255, 0.7)',
+    font=dict(family='Poppins', size=12, color='#0F1D2F'),
+)])
+theme_menu = len(fig.layout.updatemenus) - 1
+
+fig.add_layout_image(
+    dict(
+        source=Image.open('./img/accelerate-logo.png'),
+        xref="paper", yref="paper",
+        x=1, y=0,
+        sizex=0.25, sizey=0.25,
+        xanchor="right", yanchor="bottom",
+        opacity=1,
+    )
+)
+
+if show:
+    fig.show()
+
+# %%
+# applies ?theme=<name> from the url through the theme buttons' presets
+THEME_SCRIPT = """
+var gd = document.getElementById('{plot_id}');
+var theme = new URLSearchParams(window.location.search).get('theme');
+var menu = %d;
+gd.layout.updatemenus[menu].buttons.forEach(function (button, i) {
+    if (!theme || button.label.toLowerCase() !== theme.toLowerCase()) return;
+    var update = Object.assign({}, button.args[0]);
+    update['updatemenus[' + menu + '].active'] = i;
+    Plotly.relayout(gd, update);
+});
+"""
+
+# a fixed div id (plotly picks a random one) so an unchanged map writes identical bytes
+fig.write_html('index.html', include_plotlyjs=plotlyjs_bundle('.'), div_id='grantee-map',
+               post_script=[zoom_script(level_traces), THEME_SCRIPT % theme_menu])
+
+# old links to the dark page land on the same map in the dark theme
+redirect = 'index.html?theme=dark'
+with open('accelerate-grantees-darkbg.html', 'w', encoding='utf-8') as file:
+    file.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8" />
+<meta http-equiv="refresh" content="0; url={redirect}" />
+<link rel="canonical" href="index.html" />
+<script>window.location.replace({json.dumps(redirect)} + window.location.hash);</script>
+</head>
+<body><a href="{redirect}">Accelerate's Grantees</a></body>
+</html>
+""")
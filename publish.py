@@ -0,0 +1,166 @@
+#%%
+# build the static site: minified pages, content-hashed assets and pre-compressed copies
+#
+#   python publish.py
+#
+# everything under `sources` is copied into `out_dir`. assets (plotly.js, figure specs,
+# geometry, ...) get a content hash in their name so the host can cache them forever, and
+# every reference to them in the pages is rewritten. pages keep their names since they're
+# linked from outside (og:url), as do the files plotly.js or og:image ask for by a fixed
+# name. html and json are minified, and every text file gets .gz and .br siblings for hosts
+# that serve pre-compressed files. manifest.json maps each source path to its published one.
+import fnmatch
+import glob
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+    print('brotli is not installed; writing .gz files only')
+
+# (source file or directory, where it's published under out_dir)
+sources = [
+    ('index.html', 'index.html'),
+    ('accelerate-grantees-darkbg.html', 'accelerate-grantees-darkbg.html'),
+    # the plotly.js index.html loads (see grantee-map.py)
+    *[(path, path) for path in glob.glob('plotly-*.min.js')],
+    ('esser-expenditures/figures', 'html-files'),
+    ('esser-expenditures/figures/img', 'img'),  # og:image thumbnails
+]
+
+out_dir = './public'
+
+# published under their own names (relative to the source directory)
+stable = ['*.html', 'topojson/*', 'img/*']
+
+# build state, not published
+skip = ['.fingerprints.json', '*.tmp']
+
+# already carry a content hash: plotly-<version>.<hash>.min.js
+prehashed = re.compile(r'\.[0-9a-f]{12}\.min\.js$')
+
+compressible = ('.html', '.js', '.json', '.css', '.svg', '.txt')
+
+# don't bother compressing tiny files
+min_compress_size = 1024
+
+
+def minify(path, data):
+    if path.endswith('.json'):
+        return json.dumps(json.loads(data), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if path.endswith('.html'):
+        # indentation and blank lines only; newlines are kept so inline scripts parse the same
+        lines = (line.strip() for line in data.decode('utf-8').splitlines())
+        return '\n'.join(line for line in lines if line).encode('utf-8')
+    return data
+
+
+def hashed_name(path, data):
+    if any(fnmatch.fnmatch(path, pattern) for pattern in stable) or prehashed.search(path):
+        return path
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def collect():
+    # {source path: (path relative to its source root, published prefix)}
+    # a directory listed as its own source is published there, not under its parent
+    listed = {os.path.normpath(source) for source, _ in sources}
+    files = {}
+    for source, target in sources:
+        if os.path.isfile(source):
+            files[source] = (os.path.basename(source), os.path.dirname(target))
+            continue
+        for root, dirs, names in os.walk(source):
+            dirs[:] = [d for d in dirs if os.path.normpath(os.path.join(root, d)) not in listed]
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, source).replace(os.sep, '/')
+                if not any(fnmatch.fnmatch(relative, pattern) for pattern in skip):
+                    files[path] = (relative, target)
+    return files
+
+
+def compress(path, data):
+    with open(f'{path}.gz', 'wb') as file:
+        # mtime=0 so unchanged files compress to identical bytes
+        with gzip.GzipFile(fileobj=file, mode='wb', compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    if brotli is not None:
+        with open(f'{path}.br', 'wb') as file:
+            file.write(brotli.compress(data, quality=11))
+
+
+# each file's references are rewritten before its own name is hashed, so files are named in
+# dependency order: binary/js assets, then json (specs, geometry), then the pages. a json file
+# that references another json file would see its unhashed name, which nothing does today.
+def order(path):
+    return 2 if path.endswith('.html') else 1 if path.endswith('.json') else 0
+
+
+# a file's references are relative to its own directory: dashboard.html and
+# lea-rollup/dashboard.html both say 'specs/<name>.json' and mean different files. returns
+# {reference as written in the file: its hashed replacement} for the already-named files
+# published under the same target
+def relative_references(relative, target, renames, files):
+    here = posixpath.dirname(relative)
+    references = {}
+    for other, name in renames.items():
+        other_relative, other_target = files[other]
+        if other_target != target or name == other_relative:
+            continue
+        references[posixpath.relpath(other_relative, here or '.')] = posixpath.relpath(name, here or '.')
+    return references
+
+
+files = collect()
+
+contents = {}
+renames = {}
+for path in sorted(files, key=order):
+    relative, target = files[path]
+    with open(path, 'rb') as file:
+        data = file.read()
+    if path.endswith(('.html', '.json')):
+        data = minify(path, data)
+        references = relative_references(relative, target, renames, files)
+        if references:
+            # whole references only: not 'specs/x.json' inside 'lea-rollup/specs/x.json'
+            alternatives = '|'.join(re.escape(reference) for reference in sorted(references, key=len, reverse=True))
+            pattern = re.compile(f'(?<![\\w./-])(?:{alternatives})')
+            data = pattern.sub(lambda match: references[match.group(0)], data.decode('utf-8')).encode('utf-8')
+    contents[path] = data
+    renames[path] = hashed_name(relative, data)
+
+if os.path.exists(out_dir):
+    shutil.rmtree(out_dir)
+
+manifest = {}
+before = after = 0
+for path, (relative, target) in files.items():
+    published = '/'.join(part for part in (target, renames[path]) if part)
+    destination = os.path.join(out_dir, published)
+    os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+    data = contents[path]
+    with open(destination, 'wb') as file:
+        file.write(data)
+    if destination.endswith(compressible) and len(data) >= min_compress_size:
+        compress(destination, data)
+        after += os.path.getsize(f'{destination}.gz')
+    else:
+        after += len(data)
+    before += os.path.getsize(path)
+    manifest[path.replace(os.sep, '/')] = published
+
+with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as file:
+    json.dump(manifest, file, indent=2, sort_keys=True)
+
+print(f'Published {len(files)} files to {out_dir}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB gzipped')
+# %%
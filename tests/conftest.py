@@ -0,0 +1,6 @@
+# tests for the repo-root scripts; run from the repo root: python -m pytest tests
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
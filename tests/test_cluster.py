@@ -0,0 +1,26 @@
+import pandas as pd
+
+from cluster import CELL_SIZES, cluster_levels
+
+
+def grantees():
+    return pd.DataFrame({
+        'grantee': ['A', 'B', 'C', 'D', 'E'],
+        'lat': [41.80, 41.81, 40.70, None, 35.0],
+        'lon': [-71.40, -71.41, -74.00, -80.0, None],
+        'cohort': ['CEA 2022', 'CEA 2022', None, 'CEA 2023', 'CEA 2023'],
+    })
+
+
+def test_every_located_grantee_is_on_every_level():
+    for cell_size, clusters in cluster_levels(grantees()).items():
+        # D and E have no coordinates; C has no cohort but still gets a marker
+        assert clusters['count'].sum() == 3, cell_size
+        assert not clusters[['lat', 'lon']].isna().any().any()
+    assert set(cluster_levels(grantees())) == set(CELL_SIZES)
+
+
+def test_grantees_are_clustered_per_cohort():
+    coarse = cluster_levels(grantees())[CELL_SIZES[0]]
+    assert sorted(coarse['count'].tolist()) == [1, 2]
+    assert coarse.loc[coarse['count'] == 1, 'cohort'].isna().all()
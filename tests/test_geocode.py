@@ -0,0 +1,21 @@
+import math
+
+import pandas as pd
+
+from geocode import geocode, normalize_zipcodes
+
+
+def test_zipcodes_are_normalized():
+    zipcodes = pd.Series(['02903', '02903-1234', 2903, 2903.0, '  10001 ', 'n/a', None, float('nan'), '123456'],
+                         dtype=object)
+    assert normalize_zipcodes(zipcodes).tolist() == \
+        ['02903', '02903', '02903', '02903', '10001', pd.NA, pd.NA, pd.NA, pd.NA]
+
+
+def test_geocode_keeps_the_input_order():
+    centroids = pd.DataFrame({'lat': [41.8, 40.7], 'lon': [-71.4, -74.0]},
+                             index=pd.Index(['02903', '10001'], name='zipcode'))
+    coordinates = geocode(pd.Series(['10001-0001', None, 2903.0, '99999'], index=[5, 6, 7, 8]), centroids)
+    assert coordinates.index.tolist() == [5, 6, 7, 8]
+    assert coordinates.loc[[5, 7]].to_numpy().tolist() == [[40.7, -74.0], [41.8, -71.4]]
+    assert all(math.isnan(value) for value in coordinates.loc[[6, 8]].to_numpy().ravel())
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def run(cwd):
+    subprocess.run([sys.executable, os.path.join(ROOT, 'google-analytics.py')], cwd=cwd, check=True,
+                   capture_output=True)
+
+
+def test_a_second_run_leaves_the_pages_alone(tmp_path):
+    figures = tmp_path / 'esser-expenditures' / 'figures'
+    figures.mkdir(parents=True)
+    (figures / 'state-esser-allocations.html').write_text('<html>\n<head><meta charset="utf-8" /></head>\n'
+                                                          '<body>' + 'x' * 100_000 + '</body>\n</html>\n')
+    (figures / 'fragment.html').write_text('<div>no head</div>\n')
+
+    run(tmp_path)
+    first = {path.name: path.read_bytes() for path in figures.iterdir()}
+    page = first['state-esser-allocations.html'].decode('utf-8')
+    assert page.count('googletagmanager.com/gtag/js?id=') == 1
+    assert page.index('<head>') < page.index('og:title') < page.index('</head>')
+    assert page.endswith('x' * 100_000 + '</body>\n</html>\n')
+    assert first['fragment.html'] == b'<div>no head</div>\n'
+
+    run(tmp_path)
+    assert {path.name: path.read_bytes() for path in figures.iterdir()} == first
@@ -0,0 +1,48 @@
+import os
+import re
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+DASHBOARD = '<html><body><div class="figure" data-spec="specs/{name}.json"></div>' \
+            '<script charset="utf-8" src="{plotlyjs}"></script></body></html>\n'
+
+
+def test_nested_dashboard_references_its_own_specs(tmp_path):
+    figures = tmp_path / 'esser-expenditures' / 'figures'
+    bundle = 'plotly-2.35.2.0123456789ab.min.js'
+    write(str(figures / bundle), 'var Plotly = {};')
+    # the same figure names at two levels, built from different data
+    for prefix, value in (('', 1), ('lea-rollup/', 2)):
+        plotlyjs = bundle if not prefix else f'../{bundle}'
+        for name in ('state-esser-allocations', 'state-esser-allocations-histogram'):
+            write(str(figures / f'{prefix}specs/{name}.json'), f'{{"data": [{{"y": [{value}]}}], "name": "{name}"}}')
+            write(str(figures / f'{prefix}{name}.html'), f'<html>{name} {value}</html>\n')
+        write(str(figures / f'{prefix}dashboard.html'),
+              DASHBOARD.format(name='state-esser-allocations', plotlyjs=plotlyjs)
+              + DASHBOARD.format(name='state-esser-allocations-histogram', plotlyjs=plotlyjs))
+
+    subprocess.run([sys.executable, os.path.join(ROOT, 'publish.py')], cwd=tmp_path, check=True,
+                   capture_output=True)
+
+    public = tmp_path / 'public' / 'html-files'
+    for page, value in (('dashboard.html', 1), ('lea-rollup/dashboard.html', 2)):
+        html = (public / page).read_text(encoding='utf-8')
+        references = re.findall(r'(?:data-spec|src)="([^"]+)"', html)
+        assert len(references) == 4
+        for reference in references:
+            target = os.path.normpath(os.path.join(public, os.path.dirname(page), reference))
+            assert os.path.exists(target), (page, reference)
+        for reference in re.findall(r'data-spec="([^"]+)"', html):
+            assert re.fullmatch(r'specs/[\w-]+\.[0-9a-f]{12}\.json', reference)
+            spec = os.path.join(public, os.path.dirname(page), reference)
+            with open(spec, encoding='utf-8') as file:
+                assert f'"y":[{value}]' in file.read()